@@ -0,0 +1,283 @@
+"""
+本地 mock Responses API（OpenAI 兼容），给压测用：
+- POST /v1/responses：按脚本回 function_call 或文本，延迟按配置的分布采样；
+  stream=true 时按 SSE 逐段推 output_text.delta（首包延迟按分布采样，之后每段 --chunk-delay）
+- GET  /stats：已处理的请求数（压测脚本用来算每个 run 的 LLM 步数）
+- --rpm N 时模拟服务端限流：每个响应带 x-ratelimit-* 头，令牌桶（容量 N，每秒回填 N/60）空了回 429 + retry-after-ms
+
+脚本（--pattern）：
+- direct      : 永远直接回文本
+- tool_once   : 有 tools 时先调一次 calculator，拿到 observation 后回文本
+- tool_n:N    : 连续调 N 次工具（每轮参数不同）后回文本
+- repeat:N    : 连续 N 轮发完全相同的工具调用（模拟模型卡在死循环里）
+- parallel:N  : 一轮里并行发 N 个工具调用，然后回文本
+router / planner（不带 tools 的请求）按 system prompt 关键字回固定 JSON。
+
+  python benchmarks/mock_server.py --port 18081 --latency lognormal:0.05:0.5 --pattern tool_once
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA （单位：秒）
+    """
+    kind, _, rest = spec.partition(":")
+    args = [float(x) for x in rest.split(":") if x]
+    if kind == "fixed":
+        return lambda: args[0] if args else 0.0
+    if kind == "uniform":
+        lo, hi = args
+        return lambda: random.uniform(lo, hi)
+    if kind == "lognormal":
+        import math
+        median, sigma = args
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"unknown latency spec: {spec}")
+
+def parse_pattern(spec: str) -> Tuple[int, int, bool]:
+    """返回 (工具轮数, 每轮并行调用数, 每轮是否重复同样的参数)。"""
+    kind, _, rest = spec.partition(":")
+    if kind == "direct":
+        return 0, 1, False
+    if kind == "tool_once":
+        return 1, 1, False
+    if kind == "tool_n":
+        return int(rest or 1), 1, False
+    if kind == "repeat":
+        return int(rest or 1), 1, True
+    if kind == "parallel":
+        return 1, int(rest or 2), False
+    raise ValueError(f"unknown pattern: {spec}")
+
+def _text_of(item: Dict[str, Any]) -> str:
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(c.get("text", "") for c in content if isinstance(c, dict))
+    return ""
+
+def _message(text: str) -> Dict[str, Any]:
+    return {
+        "type": "message",
+        "id": f"msg_{uuid.uuid4().hex[:12]}",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+def _function_call(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    cid = uuid.uuid4().hex[:12]
+    return {
+        "type": "function_call",
+        "id": f"fc_{cid}",
+        "call_id": f"call_{cid}",
+        "name": name,
+        "arguments": json.dumps(args),
+        "status": "completed",
+    }
+
+def script_output(body: Dict[str, Any], rounds: int, fanout: int, repeat: bool = False) -> List[Dict[str, Any]]:
+    items = body.get("input") or []
+    if isinstance(items, str):
+        items = [{"role": "user", "content": items}]
+    system = " ".join(_text_of(i) for i in items if i.get("role") == "system").lower()
+    tools = body.get("tools") or []
+
+    if not tools:
+        if "router" in system:
+            route = "direct" if rounds == 0 else "react"
+            return [_message(json.dumps({"route": route, "tools": ["calculator"], "reason": "mock"}))]
+        if "planner" in system:
+            steps = [{"id": 1, "goal": "compute", "tool_hint": "calculator", "depends_on": []}]
+            return [_message(json.dumps({"steps": steps}))]
+        return [_message("mock final answer")]
+
+    if body.get("tool_choice") == "none":
+        return [_message("mock final answer")]
+    done_rounds = sum(1 for i in items if i.get("type") == "function_call")
+    round_idx = done_rounds // max(1, fanout)
+    if round_idx < rounds:
+        base = 0 if repeat else round_idx * fanout
+        return [_function_call("calculator", {"expression": f"{base + k + 1}*7"}) for k in range(fanout)]
+    return [_message("mock final answer")]
+
+class MockState:
+    def __init__(
+        self,
+        latency: Callable[[], float],
+        rounds: int,
+        fanout: int,
+        chunk_delay: float = 0.0,
+        rpm: int = 0,
+        repeat: bool = False,
+    ) -> None:
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.rounds = rounds
+        self.fanout = fanout
+        self.repeat = repeat
+        self.rpm = rpm
+        self.requests = 0
+        self.throttled = 0
+        self.bucket = float(rpm)
+        self.bucket_ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def admit(self) -> Tuple[bool, Dict[str, str]]:
+        """令牌桶限流（和 OpenAI 一样按速率回填）；返回 (是否放行, x-ratelimit-* 头)。rpm=0 表示不限。"""
+        if not self.rpm:
+            return True, {}
+        now = time.monotonic()
+        rate = self.rpm / 60.0
+        with self.lock:
+            self.bucket = min(float(self.rpm), self.bucket + (now - self.bucket_ts) * rate)
+            self.bucket_ts = now
+            ok = self.bucket >= 1.0
+            if ok:
+                self.bucket -= 1.0
+            else:
+                self.throttled += 1
+            level = self.bucket
+        headers = {
+            "x-ratelimit-limit-requests": str(self.rpm),
+            "x-ratelimit-remaining-requests": str(int(level)),
+            "x-ratelimit-reset-requests": f"{(self.rpm - level) / rate:.3f}s",
+        }
+        if not ok:
+            headers["retry-after-ms"] = str(int((1.0 - level) / rate * 1000) + 1)
+        return ok, headers
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            pass
+
+        def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send(200, {"requests": state.requests, "throttled": state.throttled})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", "0"))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/responses"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            ok, rl_headers = state.admit()
+            if not ok:
+                self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}, rl_headers)
+                return
+            with state.lock:
+                state.requests += 1
+            time.sleep(max(0.0, state.latency()))
+            output = script_output(body, state.rounds, state.fanout, state.repeat)
+            response = {
+                "id": f"resp_{uuid.uuid4().hex[:12]}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "status": "completed",
+                "model": body.get("model", "mock"),
+                "output": output,
+                "parallel_tool_calls": True,
+                "tool_choice": body.get("tool_choice", "auto"),
+                "tools": body.get("tools") or [],
+                "usage": {
+                    "input_tokens": 100,
+                    "output_tokens": 20,
+                    "total_tokens": 120,
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            }
+            if body.get("stream"):
+                self._stream(response, rl_headers)
+            else:
+                self._send(200, response, rl_headers)
+
+        def _stream(self, response: Dict[str, Any], headers: Dict[str, str]) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.close_connection = True
+            seq = 0
+
+            def emit(payload: Dict[str, Any]) -> None:
+                nonlocal seq
+                payload["sequence_number"] = seq
+                seq += 1
+                self.wfile.write(f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            try:
+                emit({"type": "response.created", "response": {**response, "status": "in_progress", "output": []}})
+                for idx, item in enumerate(response["output"]):
+                    if item["type"] != "message":
+                        continue
+                    text = item["content"][0]["text"]
+                    for k in range(0, len(text), 8):
+                        if state.chunk_delay:
+                            time.sleep(state.chunk_delay)
+                        emit({
+                            "type": "response.output_text.delta",
+                            "item_id": item["id"],
+                            "output_index": idx,
+                            "content_index": 0,
+                            "delta": text[k:k + 8],
+                        })
+                emit({"type": "response.completed", "response": response})
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端拿到需要的字段后提前断开
+                pass
+
+    return Handler
+
+def serve(host: str, port: int, latency: str, pattern: str, chunk_delay: float = 0.0, rpm: int = 0) -> ThreadingHTTPServer:
+    rounds, fanout, repeat = parse_pattern(pattern)
+    state = MockState(parse_latency(latency), rounds, fanout, chunk_delay, rpm, repeat)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock OpenAI Responses API for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--latency", default="fixed:0.05")
+    parser.add_argument("--pattern", default="tool_once")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed text deltas")
+    parser.add_argument("--rpm", type=int, default=0, help="emulate a server-side requests/minute limit (0 = unlimited)")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency, args.pattern, args.chunk_delay, args.rpm)
+    print(f"mock responses api on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
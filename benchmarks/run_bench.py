@@ -0,0 +1,215 @@
+"""
+压测 / 回归基准：
+1. 子进程起 mock Responses API（benchmarks/mock_server.py）
+2. 把 OPENAI_BASE_URL 指过去，按多个并发档位驱动 ReactAgent / AgentFSM / agent/re-act.py
+3. 统计吞吐、延迟分位、每个 LLM step 的框架 CPU 时间、峰值 RSS，写 JSON baseline
+4. --compare 时和已有 baseline 对比，超过 tolerance 的指标标为回归（退出码 1）
+
+  python benchmarks/run_bench.py --out benchmarks/baseline.json
+  python benchmarks/run_bench.py --compare benchmarks/baseline.json --tolerance 0.15
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ("react_agent", "fsm", "re_act")
+
+# 指标方向：higher 表示越大越好
+METRICS = {
+    "throughput_rps": "higher",
+    "latency_p50_s": "lower",
+    "latency_p95_s": "lower",
+    "latency_p99_s": "lower",
+    "cpu_ms_per_step": "lower",
+}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _percentile(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p * len(xs)))]
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是 bytes
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+class MockServer:
+    def __init__(self, latency: str, pattern: str) -> None:
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "mock_server.py"),
+             "--port", str(self.port), "--latency", latency, "--pattern", pattern],
+            stdout=subprocess.PIPE,
+        )
+        self.proc.stdout.readline()
+
+    def requests(self) -> int:
+        with urllib.request.urlopen(f"{self.base_url}/stats") as r:
+            return json.loads(r.read())["requests"]
+
+    def close(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+
+def make_runner(target: str) -> Callable[[str], str]:
+    """
+    返回 query -> answer 的可调用对象。需要在 OPENAI_BASE_URL 设好之后再调用（模块级 client 会读环境变量）。
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if target == "re_act":
+        spec = importlib.util.spec_from_file_location("re_act", os.path.join(ROOT, "agent", "re-act.py"))
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        return lambda q: mod.run_react_agent(q, max_steps=10)
+
+    from react_agent.app.llm import LLM
+    from react_agent.app.memory import Memory
+    from react_agent.app.trace import Tracer
+
+    llm = LLM(model="mock")
+    if target == "react_agent":
+        from react_agent.app.agent import ReactAgent, AgentConfig
+        return lambda q: ReactAgent(llm, Memory(), Tracer(), AgentConfig(max_steps=10)).run(q)
+    if target == "fsm":
+        from react_agent.app.agent_fsm import AgentFSM, AgentConfig as FSMConfig
+        return lambda q: AgentFSM(llm, Tracer(), FSMConfig(max_tool_steps=10)).run(q)
+    raise ValueError(f"unknown target: {target}")
+
+def bench_level(runner: Callable[[str], str], server: MockServer, concurrency: int, runs: int) -> Dict[str, Any]:
+    def one(i: int) -> float:
+        t0 = time.perf_counter()
+        runner(f"bench query {i}: (12.5*(3+4))/5")
+        return time.perf_counter() - t0
+
+    req0 = server.requests()
+    # 整个进程的 CPU：sub-executor / 流水线线程里的开销也要算进来（mock server 在子进程，不计入）
+    cpu0 = time.process_time()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, range(runs)))
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu0
+    steps = server.requests() - req0
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "llm_steps": steps,
+        "throughput_rps": round(runs / wall, 3),
+        "latency_p50_s": round(_percentile(latencies, 0.50), 4),
+        "latency_p95_s": round(_percentile(latencies, 0.95), 4),
+        "latency_p99_s": round(_percentile(latencies, 0.99), 4),
+        # 每个 LLM step 在本进程里花的 CPU（SDK 序列化 + agent 框架 + 工具），不含 mock 延迟
+        "cpu_ms_per_step": round(cpu * 1000 / max(1, steps), 3),
+    }
+
+def run_suite(targets: List[str], levels: List[int], runs_per_level: int, latency: str, pattern: str) -> Dict[str, Any]:
+    server = MockServer(latency, pattern)
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    results: Dict[str, Any] = {}
+    try:
+        for target in targets:
+            runner = make_runner(target)
+            with contextlib.redirect_stdout(io.StringIO()):
+                runner("warmup")
+            results[target] = [bench_level(runner, server, c, max(runs_per_level, c)) for c in levels]
+            for r in results[target]:
+                print(f"{target:12s} c={r['concurrency']:<3d} rps={r['throughput_rps']:<8} "
+                      f"p50={r['latency_p50_s']:<7} p95={r['latency_p95_s']:<7} cpu/step={r['cpu_ms_per_step']}ms")
+    finally:
+        server.close()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "latency": latency,
+            "pattern": pattern,
+            "levels": levels,
+            "runs_per_level": runs_per_level,
+        },
+        "results": results,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """返回回归描述列表；空列表表示没有回归。"""
+    regressions: List[str] = []
+    for target, rows in current["results"].items():
+        base_rows = {r["concurrency"]: r for r in baseline.get("results", {}).get(target, [])}
+        for row in rows:
+            base = base_rows.get(row["concurrency"])
+            if not base:
+                continue
+            for metric, direction in METRICS.items():
+                old, new = base.get(metric), row.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                worse = change < -tolerance if direction == "higher" else change > tolerance
+                if worse:
+                    regressions.append(f"{target} c={row['concurrency']} {metric}: {old} -> {new} ({change:+.1%})")
+    old_rss, new_rss = baseline.get("peak_rss_mb"), current.get("peak_rss_mb")
+    if old_rss and new_rss and (new_rss - old_rss) / old_rss > tolerance:
+        regressions.append(f"peak_rss_mb: {old_rss} -> {new_rss}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark agents against a mock Responses API.")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--levels", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--runs", type=int, default=32, help="runs per concurrency level")
+    parser.add_argument("--latency", default="lognormal:0.02:0.5")
+    parser.add_argument("--pattern", default="tool_once")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    targets = [t for t in args.targets.split(",") if t]
+    for t in targets:
+        if t not in TARGETS:
+            parser.error(f"unknown target {t}; choose from {TARGETS}")
+    levels = [int(x) for x in args.levels.split(",") if x]
+
+    report = run_suite(targets, levels, args.runs, args.latency, args.pattern)
+    print(f"peak_rss_mb={report['peak_rss_mb']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for r in regressions:
+                print("  " + r)
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,20 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from .llm import LLM
 from .memory import Memory
+from .blobstore import get_blob_store
 from .tools import TOOLS_SCHEMA, TOOL_REGISTRY
 from .trace import Tracer
-from .prompts import SYSTEM_INSTRUCTIONS
+from .prompts import SYSTEM_INSTRUCTIONS, LOOP_WARNING, LOOP_FINAL
+from .loopguard import LoopGuard
+from .ratelimit import PRIORITY_IN_FLIGHT, PRIORITY_NEW
 
 @dataclass
 class AgentConfig:
     max_steps: int = 10
+    # 死循环检测（见 loopguard.py）：重复的工具调用先纠正一次，还重复就强制 final
+    detect_loops: bool = True
+    loop_max_period: int = 2
+    loop_min_repeats: int = 2
 
 class ReactAgent:
     def __init__(self, llm: LLM, memory: Memory, tracer: Tracer, config: AgentConfig = AgentConfig()):
@@ -72,37 +79,49 @@ class ReactAgent:
 
         self.tracer.log("tool.call", name=tool_name, args=args, call_id=call_id)
 
-        fn = TOOL_REGISTRY.get(tool_name)
-        if not fn:
-            output = json.dumps({"ok": False, "error": f"unknown tool: {tool_name}"}, ensure_ascii=False)
-        else:
-            try:
-                output = fn(**args)
-            except TypeError as e:
-                output = json.dumps({"ok": False, "error": f"bad args: {e}"}, ensure_ascii=False)
-            except Exception as e:
-                output = json.dumps({"ok": False, "error": f"tool failed: {type(e).__name__}: {e}"}, ensure_ascii=False)
-
-        self.tracer.log("tool.result", name=tool_name, call_id=call_id, output=output)
+        with self.tracer.span("span.tool", name=tool_name, call_id=call_id):
+            fn = TOOL_REGISTRY.get(tool_name)
+            if not fn:
+                output = json.dumps({"ok": False, "error": f"unknown tool: {tool_name}"}, ensure_ascii=False)
+            else:
+                try:
+                    output = fn(**args)
+                except TypeError as e:
+                    output = json.dumps({"ok": False, "error": f"bad args: {e}"}, ensure_ascii=False)
+                except Exception as e:
+                    output = json.dumps({"ok": False, "error": f"tool failed: {type(e).__name__}: {e}"}, ensure_ascii=False)
+
+        # 大 observation 旁路存储：memory / trace 里只留预览 + handle（read_observation 自己的分页结果不再旁路）
+        handle = None
+        if tool_name != "read_observation":
+            output, handle = get_blob_store().offload(output)
+        self.tracer.log("tool.result", name=tool_name, call_id=call_id, output=output, blob=handle)
 
         # Observation item (function_call_output) 回填模型
         output_type = "function_call_output" if call_type == "function_call" else "tool_output"
         return {"type": output_type, "call_id": call_id, "output": output}
 
     def run(self, user_query: str) -> str:
+        with self.tracer.span("span.run", agent="react"):
+            return self._run(user_query)
+
+    def _run(self, user_query: str) -> str:
         # 初始化上下文
         self.memory.add({"role": "system", "content": SYSTEM_INSTRUCTIONS})
         self.memory.add({"role": "user", "content": user_query})
 
+        guard = LoopGuard(self.config.loop_max_period, self.config.loop_min_repeats) if self.config.detect_loops else None
         for step in range(self.config.max_steps):
             items = self.memory.snapshot()
             self.tracer.log("llm.request", step=step, items_len=len(items))
 
-            resp = self.llm.respond(
-                input_items=items,
-                tools=TOOLS_SCHEMA,
-                tool_choice="auto",
-            )
+            with self.tracer.span("span.llm", state="react", step=step):
+                resp = self.llm.respond(
+                    input_items=items,
+                    tools=TOOLS_SCHEMA,
+                    tool_choice="auto",
+                    priority=PRIORITY_IN_FLIGHT if step else PRIORITY_NEW,
+                )
 
             # 1) 先处理工具调用（Act）
             tool_calls = self._extract_tool_calls(resp)
@@ -114,6 +133,16 @@ class ReactAgent:
                 for call in tool_calls:
                     obs = self._run_one_tool(self._normalize_item(call))
                     self.memory.add(obs)
+                verdict = guard.check(self.memory) if guard is not None else None
+                if verdict == "warn":
+                    self.tracer.log("loop.warn", label="react", step=step, period=guard.period)
+                    self.memory.add({"role": "developer", "content": LOOP_WARNING})
+                elif verdict == "stop":
+                    self.tracer.log(
+                        "loop.break", label="react", step=step, period=guard.period,
+                        rounds_saved=self.config.max_steps - step - 1,
+                    )
+                    return self._final_without_tools(step)
                 # 回到循环继续（Reason -> next Act/Final）
                 continue
 
@@ -129,3 +158,17 @@ class ReactAgent:
             break
 
         return "Reached max steps without a final answer."
+
+    def _final_without_tools(self, step: int) -> str:
+        """检测到死循环：禁止工具，让模型基于已有 observation 立即作答。"""
+        self.memory.add({"role": "developer", "content": LOOP_FINAL})
+        with self.tracer.span("span.llm", state="react", step=step, forced=True):
+            resp = self.llm.respond(
+                input_items=self.memory.snapshot(),
+                tools=TOOLS_SCHEMA,
+                tool_choice="none",
+                priority=PRIORITY_IN_FLIGHT,
+            )
+        text = self._extract_text(resp)
+        self.tracer.log("llm.text", step="forced", text=text[:200])
+        return text or "Stopped repeating tool calls without a final answer."
@@ -1,15 +1,27 @@
 import json
-from dataclasses import dataclass
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
+from .budget import DeadlineExceeded, RunBudget
+from .checkpoint import CheckpointStore
 from .llm import LLM
 from .memory import Memory
+from .loopguard import LoopGuard
 from .trace import Tracer
-from .tools import TOOLS_SCHEMA, TOOL_REGISTRY
+from .blobstore import get_blob_store
+from .tools import TOOLS_SCHEMA, TOOL_REGISTRY, TOOL_INDEX
+from .tool_index import schema_tokens
 from .router import route as route_decide, RouteDecision
-from .planner import plan as make_plan, PlanStep
-from .prompts import EXECUTOR_SYSTEM
+from .planner import plan as make_plan, plan_stream, finalize_plan, plan_levels, PlanStep
+from .prompts import EXECUTOR_SYSTEM, SUBSTEP_SYSTEM, LOOP_WARNING, LOOP_FINAL
+
+if TYPE_CHECKING:
+    from .semantic_cache import SemanticCache
 
 class State(str, Enum):
     ROUTE = "ROUTE"
@@ -23,12 +35,43 @@ class State(str, Enum):
 class AgentConfig:
     max_tool_steps: int = 10
     enable_planner: bool = True
+    # DAG 执行：plan 里互不依赖的 step 并行跑 sub-executor，最后由 join 汇总
+    enable_parallel_steps: bool = True
+    max_parallel_steps: int = 4
+    max_sub_steps: int = 4
+    # 流水线：planner 流式输出时，step 一解码出来就提交 sub-executor，不等整个 plan 生成完
+    pipeline_plan: bool = True
+    # 每次 run 的时间/token 预算（None 不限制），run() 参数可按次覆盖
+    deadline_s: Optional[float] = None
+    token_budget: Optional[int] = None
+    # 剩余时间不足 min_plan_time_s 时跳过 PLAN；final_reserve_s 给强制 final 预留时间
+    min_plan_time_s: float = 4.0
+    final_reserve_s: float = 1.0
+    # 只发相关工具的 schema：优先用 router 选出的 tools，没有时用检索索引挑 top-k
+    select_tools: bool = True
+    tool_top_k: int = 3
+    # 死循环检测：最近工具调用的 (tool, 参数, 输出) 以 ≤ loop_max_period 的周期重复 loop_min_repeats 次时
+    # 先插 developer 消息纠正，纠正后还在重复就强制 final
+    detect_loops: bool = True
+    loop_max_period: int = 2
+    loop_min_repeats: int = 2
 
 class AgentFSM:
-    def __init__(self, llm: LLM, tracer: Tracer, config: AgentConfig = AgentConfig()):
+    def __init__(
+        self,
+        llm: LLM,
+        tracer: Tracer,
+        config: AgentConfig = AgentConfig(),
+        answer_cache: Optional["SemanticCache"] = None,
+        checkpoint_store: Optional[CheckpointStore] = None,
+    ):
         self.llm = llm
         self.tracer = tracer
         self.config = config
+        # direct 路由的答案缓存（见 semantic_cache.py）；多个 AgentFSM 可以共享同一个实例
+        self.answer_cache = answer_cache
+        # 给了就在每次状态转移 / 每轮工具调用后写 checkpoint，支持 resume(run_id)
+        self.checkpoint_store = checkpoint_store
 
         self.state: State = State.ROUTE
         self.user_query: str = ""
@@ -36,48 +79,214 @@ class AgentFSM:
         self.plan_steps: List[PlanStep] = []
         self.memory = Memory()
         self.final_answer: Optional[str] = None
+        self.budget = RunBudget()
+        self._pipeline: Optional[Tuple[ThreadPoolExecutor, Dict[int, Future]]] = None
+        self.run_id: str = ""
+        self.exec_step: int = 0                 # 主 executor 已完成的工具轮数
+        self.step_results: Dict[int, str] = {}  # 已完成的 sub-executor 结果
+        # 跑到一半的 sub-executor：{step_id: {"memory": [...], "step": 已完成的工具轮数}}，resume 时接着跑
+        self.substeps: Dict[int, Dict[str, Any]] = {}
+        self._ckpt_lock = threading.Lock()
 
     # --------- public ----------
-    def run(self, user_query: str) -> str:
+    def run(
+        self,
+        user_query: str,
+        deadline_s: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        run_id: Optional[str] = None,
+    ) -> str:
         self._reset(user_query)
+        self.run_id = run_id or uuid.uuid4().hex
+        self._start_budget(deadline_s, token_budget)
+        self._checkpoint("start")
+        return self._drive()
 
-        while self.state not in (State.FINAL, State.STOP):
-            self.tracer.log("fsm.state", state=self.state)
-
-            if self.state == State.ROUTE:
-                self._state_route()
-            elif self.state == State.PLAN:
-                self._state_plan()
-            elif self.state == State.DIRECT_ANSWER:
-                self._state_direct_answer()
-            elif self.state == State.EXECUTE:
-                self._state_execute()
-            else:
-                self.state = State.STOP
+    def resume(self, run_id: str, deadline_s: Optional[float] = None, token_budget: Optional[int] = None) -> str:
+        """
+        从最后一个 checkpoint 继续：已完成的 state / 工具轮次 / sub-executor 都不再重跑。
+        预算按本次调用重新计算。
+        """
+        if self.checkpoint_store is None:
+            raise RuntimeError("resume requires a checkpoint_store")
+        record = self.checkpoint_store.latest(run_id)
+        if record is None:
+            raise KeyError(f"no checkpoint for run {run_id}")
+        self._restore(record)
+        self.tracer.log("fsm.resume", run_id=run_id, state=self.state, exec_step=self.exec_step, reason=record.get("reason"))
+        self._start_budget(deadline_s, token_budget)
+        return self._drive()
+
+    def _start_budget(self, deadline_s: Optional[float], token_budget: Optional[int]) -> None:
+        self.budget = RunBudget(
+            deadline_s=deadline_s if deadline_s is not None else self.config.deadline_s,
+            max_tokens=token_budget if token_budget is not None else self.config.token_budget,
+            tracer=self.tracer,
+        )
+
+    def _drive(self) -> str:
+        with self.tracer.span("span.run", agent="fsm"):
+            try:
+                while self.state not in (State.FINAL, State.STOP):
+                    self.tracer.log("fsm.state", state=self.state)
+
+                    with self.tracer.span("span.state", state=self.state.value):
+                        if self.state == State.ROUTE:
+                            self._state_route()
+                        elif self.state == State.PLAN:
+                            self._state_plan()
+                        elif self.state == State.DIRECT_ANSWER:
+                            self._state_direct_answer()
+                        elif self.state == State.EXECUTE:
+                            self._state_execute()
+                        else:
+                            self.state = State.STOP
+                    self._checkpoint("transition")
+            except DeadlineExceeded as e:
+                # 某次调用超出剩余时间：不再发请求，用已有的结果收尾
+                self._shutdown_pipeline()
+                self.tracer.log("budget.degrade", action="deadline_exceeded", state=e.state)
+                self.final_answer = self._degraded_answer()
+                self.state = State.FINAL
+                self._checkpoint("deadline")
 
+        self.tracer.log("budget.summary", **self.budget.summary())
         return self.final_answer or "Stopped without a final answer."
 
+    def _degraded_answer(self) -> str:
+        """deadline 降级：把已完成的 sub-executor 结果和工具 observation 原样交回去。"""
+        parts = [f"{sid}. {text}" for sid, text in sorted(self.step_results.items())]
+        for item in self.memory.items:
+            if isinstance(item, dict) and item.get("type") in ("function_call_output", "tool_output"):
+                parts.append(str(item.get("output"))[:500])
+        if not parts:
+            return "Deadline exceeded before an answer was produced."
+        return "Deadline exceeded before a final answer. Partial results:\n" + "\n".join(parts)
+
+    def _shutdown_pipeline(self) -> None:
+        if self._pipeline is not None:
+            pool, _ = self._pipeline
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._pipeline = None
+
     # --------- states ----------
     def _state_route(self) -> None:
-        self.decision = route_decide(self.llm, self.tracer, self.user_query)
+        self.decision = route_decide(self.llm, self.tracer, self.user_query, budget=self.budget)
 
         if self.decision.route == "direct":
             self.state = State.DIRECT_ANSWER
             return
 
         # react
-        if self.config.enable_planner:
+        remaining = self.budget.remaining_time()
+        if self.config.enable_planner and remaining is not None and remaining < self.config.min_plan_time_s:
+            self.tracer.log("budget.degrade", action="skip_plan", remaining_s=round(remaining, 3))
+            self.state = State.EXECUTE
+        elif self.config.enable_planner:
             self.state = State.PLAN
         else:
             self.state = State.EXECUTE
 
     def _state_plan(self) -> None:
-        self.plan_steps = make_plan(self.llm, self.tracer, self.user_query)
+        # resume 到 PLAN（流水线跑到一半进程挂了）：checkpoint 里有当时已解码的 step、已完成的 sub-executor 结果
+        # 和跑到一半的 sub-executor。重新规划后，和旧 step 完全一致（id / goal / tool_hint / 依赖）的
+        # 直接复用结果或接着跑，其余的不再对应新 plan
+        prev_steps = {s.id: s for s in self.plan_steps}
+        prev_results, prev_substeps = self.step_results, self.substeps
+        self.step_results = {}
+        self.substeps = {}
+        self.plan_steps = []
+
+        def reuse(step: PlanStep) -> Optional[str]:
+            if prev_steps.get(step.id) != step:
+                return None
+            with self._ckpt_lock:
+                if step.id in prev_substeps:
+                    self.substeps[step.id] = prev_substeps[step.id]
+                if step.id not in prev_results:
+                    return None
+                self.step_results[step.id] = prev_results[step.id]
+            self.tracer.log("plan.reuse_result", step_id=step.id)
+            return prev_results[step.id]
+
+        if not self._can_pipeline():
+            self.plan_steps = make_plan(self.llm, self.tracer, self.user_query, budget=self.budget)
+            for step in self.plan_steps:
+                reuse(step)
+            self.state = State.EXECUTE
+            return
+
+        # 流水线：已解码的 step 里出现可并行的（关键路径 < step 数，确定要走 DAG）时，
+        # 把已解码的全部提交，之后每个 step 解码即提交；一直是一条链就不提交，交给单个 executor。
+        # 依赖只会指向更早的 step，它们一定先提交，所以线程池里等依赖不会死锁。
+        pool = ThreadPoolExecutor(max_workers=self.config.max_parallel_steps)
+        futures: Dict[int, Future] = {}
+        steps: List[PlanStep] = []
+
+        def launch(step: PlanStep) -> None:
+            result = reuse(step)
+            if result is not None:
+                fut: Future = Future()
+                fut.set_result(result)
+                futures[step.id] = fut
+                return
+            self.tracer.log("pipeline.launch", step_id=step.id, decoded=len(steps))
+            futures[step.id] = pool.submit(self._run_pipelined_substep, step, futures)
+
+        try:
+            for step in plan_stream(self.llm, self.tracer, self.user_query, budget=self.budget):
+                steps.append(step)
+                # sub-executor 在 PLAN 状态下就会写 checkpoint，带上已解码的 step，resume 时才知道结果属于哪个 step
+                self.plan_steps = list(steps)
+                self.tracer.log("pipeline.step_decoded", step_id=step.id)
+                if futures:
+                    launch(step)
+                    continue
+                levels = plan_levels(steps)
+                if levels and len(levels) < len(steps):
+                    for s in steps:
+                        launch(s)
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        self.plan_steps = finalize_plan(self.tracer, steps)
+        if futures:
+            self._pipeline = (pool, futures)
+        else:
+            pool.shutdown()
         self.state = State.EXECUTE
 
+    def _can_pipeline(self) -> bool:
+        # 有预算限制时先拿到完整 plan，由 _run_plan_dag 判断预算是否够跑 DAG
+        # LLM 不支持 stream 时 plan 一次性返回，流水线没有收益
+        return (
+            self.config.pipeline_plan
+            and self.config.enable_parallel_steps
+            and not self.budget.limited
+            and hasattr(self.llm, "stream")
+        )
+
     def _state_direct_answer(self) -> None:
+        if self.answer_cache is not None:
+            hit = self.answer_cache.lookup(self.user_query)
+            if hit is not None:
+                answer, score = hit
+                self.tracer.log(
+                    "cache.hit",
+                    score=round(score, 4),
+                    hit_saved_s=round(self.answer_cache.avg_miss_latency(), 3),
+                    **self.answer_cache.stats(),
+                )
+                self.final_answer = answer
+                self.state = State.FINAL
+                return
+
         # 直接用 LLM 输出，不允许工具
-        resp = self.llm.respond(
+        start = time.monotonic()
+        resp = self.budget.respond(
+            self.llm,
+            State.DIRECT_ANSWER.value,
             input_items=[
                 {"role": "system", "content": "You answer directly. Be concise and correct."},
                 {"role": "user", "content": self.user_query},
@@ -86,6 +295,10 @@ class AgentFSM:
             tool_choice="none",
         )
         text = self._extract_text(resp)
+        if self.answer_cache is not None:
+            if text:
+                self.answer_cache.put(self.user_query, text, latency_s=time.monotonic() - start)
+            self.tracer.log("cache.miss", **self.answer_cache.stats())
         self.final_answer = text or "No answer."
         self.state = State.FINAL
 
@@ -93,8 +306,16 @@ class AgentFSM:
         """
         Executor：严格 ReAct 循环
         - 把 planner steps 作为“执行提示”写进 memory（可选）
+        - plan 存在可并行的 step 时，先按 DAG 跑 sub-executor，结果交给 join
         - 让模型 tool_call -> 我们执行 -> 回填 observation -> 继续
         """
+        if self.memory.items:
+            # resume：executor memory 已经从 checkpoint 恢复，直接从下一轮继续
+            self._run_executor()
+            return
+
+        step_results = self._run_plan_dag() if self.plan_steps else {}
+
         # 初始化 executor memory
         self.memory.add({"role": "system", "content": EXECUTOR_SYSTEM})
 
@@ -104,42 +325,291 @@ class AgentFSM:
             )
             self.memory.add({"role": "developer", "content": plan_text})
 
+        if step_results:
+            # join step：子步骤已经跑完，executor 只负责汇总（必要时仍可调用工具）
+            results_text = "Step results (already executed, combine them into the final answer):\n" + "\n".join(
+                [f"{sid}. {text}" for sid, text in sorted(step_results.items())]
+            )
+            self.memory.add({"role": "developer", "content": results_text})
+
         # 用户问题
         self.memory.add({"role": "user", "content": self.user_query})
+        self.exec_step = 0
+        self._checkpoint("execute.init")
+        self._run_executor()
 
-        for step in range(self.config.max_tool_steps):
-            items = self.memory.snapshot()
-            self.tracer.log("executor.llm.request", step=step, items_len=len(items))
+    def _run_executor(self) -> None:
+        def on_round(step: int) -> None:
+            self.exec_step = step + 1
+            self._checkpoint("execute.round")
 
-            resp = self.llm.respond(
+        text = self._react_loop(
+            self.memory, self.config.max_tool_steps, "executor", start_step=self.exec_step, on_round=on_round,
+        )
+        self.final_answer = text or "Reached max tool steps without a final answer."
+        self.state = State.FINAL
+
+    # --------- plan DAG ----------
+    def _run_plan_dag(self) -> Dict[int, str]:
+        """
+        按依赖分层执行 plan steps，同层并行。
+        没有可并行的 step（关键路径 == step 数）时不走 DAG，直接交给单个 executor 顺序完成。
+        PLAN 阶段已经流水线提交过的话，这里只收结果。
+        """
+        if self._pipeline is not None:
+            return self._collect_pipeline()
+
+        if not self.config.enable_parallel_steps or len(self.plan_steps) < 2:
+            return dict(self.step_results)
+
+        levels = plan_levels(self.plan_steps)
+        critical_path = len(levels)
+        self.tracer.log(
+            "dag.plan",
+            total_steps=len(self.plan_steps),
+            critical_path=critical_path,
+            levels=[[s.id for s in level] for level in levels],
+        )
+        if not levels or critical_path >= len(self.plan_steps):
+            self.tracer.log("dag.skip", reason="cycle" if not levels else "no_parallelism")
+            return dict(self.step_results)
+        rounds = self.budget.rounds_left(self.config.final_reserve_s)
+        if rounds is not None and rounds < critical_path + 1:
+            # 预算不够跑完关键路径 + join，直接交给单个 executor
+            self.tracer.log("dag.skip", reason="budget", rounds_left=rounds)
+            return dict(self.step_results)
+
+        # resume 时已完成的 step 直接复用
+        results: Dict[int, str] = dict(self.step_results)
+        workers = max(1, min(self.config.max_parallel_steps, max(len(level) for level in levels)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for depth, level in enumerate(levels):
+                self.tracer.log("dag.level", depth=depth, steps=[s.id for s in level])
+                futures = {s.id: pool.submit(self._run_substep, s, dict(results)) for s in level if s.id not in results}
+                for sid, fut in futures.items():
+                    results[sid] = fut.result()
+
+        self.tracer.log("dag.done", total_steps=len(self.plan_steps), critical_path=critical_path)
+        return results
+
+    def _collect_pipeline(self) -> Dict[int, str]:
+        pool, futures = self._pipeline
+        self._pipeline = None
+        try:
+            results = {sid: fut.result() for sid, fut in futures.items()}
+        finally:
+            pool.shutdown()
+        self.tracer.log(
+            "dag.done",
+            total_steps=len(self.plan_steps),
+            critical_path=len(plan_levels(self.plan_steps)),
+            pipelined=True,
+        )
+        return results
+
+    def _run_pipelined_substep(self, step: PlanStep, futures: Dict[int, Future]) -> str:
+        prior = {d: futures[d].result() for d in step.depends_on if d in futures}
+        return self._run_substep(step, prior)
+
+    def _run_substep(self, step: PlanStep, prior: Dict[int, str]) -> str:
+        """
+        Sub-executor：每个 step 有自己的小 memory，只看得到它依赖的 step 结果。
+        每轮工具调用后把 memory 和轮数写进 checkpoint（self.substeps），resume 时从下一轮继续。
+        """
+        memory = Memory()
+        with self._ckpt_lock:
+            saved = self.substeps.get(step.id)
+        start_step = 0
+        if saved is not None:
+            memory.extend(saved["memory"])
+            start_step = int(saved["step"])
+            self.tracer.log("substep.resume", step_id=step.id, start_step=start_step)
+        else:
+            memory.add({"role": "system", "content": SUBSTEP_SYSTEM})
+            deps = [(d, prior[d]) for d in step.depends_on if d in prior]
+            if deps:
+                memory.add({
+                    "role": "developer",
+                    "content": "Results of earlier steps:\n" + "\n".join([f"{d}. {t}" for d, t in deps]),
+                })
+            memory.add({
+                "role": "user",
+                "content": (
+                    f"Overall request: {self.user_query}\n"
+                    f"Your step ({step.id}): {step.goal} (tool_hint={step.tool_hint or 'none'})"
+                ),
+            })
+
+        def on_round(n: int) -> None:
+            with self._ckpt_lock:
+                self.substeps[step.id] = {"memory": memory.snapshot(), "step": n + 1}
+            self._checkpoint("substep.round")
+
+        self.tracer.log("substep.start", step_id=step.id, depends_on=step.depends_on)
+        hint = [step.tool_hint] if step.tool_hint in TOOL_REGISTRY else []
+        with self.tracer.span("span.substep", step_id=step.id):
+            text = self._react_loop(
+                memory, self.config.max_sub_steps, "substep", start_step=start_step, on_round=on_round,
+                tool_query=step.goal, tool_names=hint, step_id=step.id,
+            )
+        self.tracer.log("substep.done", step_id=step.id, ok=bool(text))
+        result = text or "(no result)"
+        with self._ckpt_lock:
+            self.step_results[step.id] = result
+            self.substeps.pop(step.id, None)
+        self._checkpoint("substep.done")
+        return result
+
+    def _react_loop(
+        self,
+        memory: Memory,
+        max_steps: int,
+        label: str,
+        start_step: int = 0,
+        on_round: Optional[Callable[[int], None]] = None,
+        tool_query: Optional[str] = None,
+        tool_names: Optional[List[str]] = None,
+        **ctx: Any,
+    ) -> Optional[str]:
+        """
+        通用 ReAct 循环：返回最终文本；用完步数或空响应时返回 None。
+        label/ctx 只用于 trace，区分主 executor 和各个 sub-executor。
+        预算快用完时不再发起工具轮次，改为强制 final。
+        start_step / on_round 给 checkpoint 用：从第几轮继续、每轮工具调用完成后回调。
+        tool_names / tool_query：本循环可用工具（显式指定 / 按文本检索），见 _select_tools。
+        """
+        charge_state = State.EXECUTE.value if label == "executor" else f"{State.EXECUTE.value}.{label}"
+        guard = LoopGuard(self.config.loop_max_period, self.config.loop_min_repeats) if self.config.detect_loops else None
+        for step in range(start_step, max_steps):
+            tools = self._select_tools(memory, tool_names, tool_query or self.user_query, label, step, **ctx)
+            rounds = self.budget.rounds_left(self.config.final_reserve_s)
+            if self.budget.exhausted() or (rounds is not None and rounds <= 0):
+                self.tracer.log("budget.degrade", action="force_final", step=step, rounds_left=rounds, **ctx)
+                return self._force_final(memory, charge_state, label, tools, **ctx)
+
+            items = memory.snapshot()
+            self.tracer.log(f"{label}.llm.request", step=step, items_len=len(items), **ctx)
+
+            resp = self.budget.respond(
+                self.llm,
+                charge_state,
                 input_items=items,
-                tools=TOOLS_SCHEMA,
+                tools=tools,
                 tool_choice="auto",
             )
 
             tool_calls = self._extract_tool_calls(resp)
             if tool_calls:
-                self.tracer.log("executor.tool_calls", step=step, count=len(tool_calls))
+                self.tracer.log(f"{label}.tool_calls", step=step, count=len(tool_calls), **ctx)
                 output_items = [self._normalize_item(i) for i in getattr(resp, "output", []) or []]
                 if output_items:
-                    self.memory.extend(output_items)
+                    memory.extend(output_items)
                 for call in tool_calls:
                     obs = self._run_one_tool(self._normalize_item(call))
-                    self.memory.add(obs)
+                    memory.add(obs)
+                verdict = guard.check(memory) if guard is not None else None
+                if verdict == "warn":
+                    self.tracer.log("loop.warn", label=label, step=step, period=guard.period, **ctx)
+                    memory.add({"role": "developer", "content": LOOP_WARNING})
+                if on_round is not None:
+                    on_round(step)
+                if verdict == "stop":
+                    self.tracer.log(
+                        "loop.break", label=label, step=step, period=guard.period,
+                        rounds_saved=max_steps - step - 1, **ctx,
+                    )
+                    return self._force_final(memory, charge_state, label, tools, note=LOOP_FINAL, **ctx)
                 continue
 
             text = self._extract_text(resp)
-            self.tracer.log("executor.text", step=step, text=text[:200])
+            self.tracer.log(f"{label}.text", step=step, text=text[:200], **ctx)
             if text:
-                self.final_answer = text
-                self.state = State.FINAL
-                return
+                return text
 
-            self.tracer.log("executor.stop", reason="empty_response")
+            self.tracer.log(f"{label}.stop", reason="empty_response", **ctx)
             break
 
-        self.final_answer = "Reached max tool steps without a final answer."
-        self.state = State.FINAL
+        return None
+
+    def _select_tools(
+        self,
+        memory: Memory,
+        names: Optional[List[str]],
+        query: str,
+        label: str,
+        step: int,
+        **ctx: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        每轮要发给模型的工具 schema：
+        1) 显式指定的（sub-executor 的 tool_hint）；主 executor 用 router 选出的 tools
+        2) 都没有时用 TOOL_INDEX 按 query 检索 top-k（工具总数不超过 k 时检索没有意义，直接全量）
+        3) 检索没命中 / 命中太弱就退回全量
+        memory 里出现过被旁路存储的大 observation 时追加 read_observation。
+        """
+        if not self.config.select_tools:
+            return TOOLS_SCHEMA
+        source = "explicit"
+        selected = list(names or [])
+        if not selected and label == "executor" and self.decision and self.decision.tools:
+            source = "router"
+            selected = list(self.decision.tools)
+        if not selected and len(TOOLS_SCHEMA) > self.config.tool_top_k:
+            source = "index"
+            selected = TOOL_INDEX.search(query, k=self.config.tool_top_k)
+        if not selected:
+            source = "all"
+            selected = [s["name"] for s in TOOLS_SCHEMA]
+        if "read_observation" not in selected and self._has_blob_handle(memory):
+            selected.append("read_observation")
+
+        tools = TOOL_INDEX.select(selected)
+        sent = schema_tokens(tools)
+        self.tracer.log(
+            "tools.select",
+            label=label,
+            step=step,
+            source=source,
+            tools=selected,
+            schema_tokens=sent,
+            saved_tokens=TOOL_INDEX.full_tokens - sent,
+            **ctx,
+        )
+        return tools
+
+    def _has_blob_handle(self, memory: Memory) -> bool:
+        for item in memory.items:
+            if item.get("type") in ("function_call_output", "tool_output") and '"handle": "blob:' in str(item.get("output", "")):
+                return True
+        return False
+
+    def _force_final(
+        self,
+        memory: Memory,
+        charge_state: str,
+        label: str,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        note: str = "Budget is almost used up. Do not call tools; answer now with what you have.",
+        **ctx: Any,
+    ) -> Optional[str]:
+        """
+        兜底（预算快用完 / 检测到死循环）：禁止工具，让模型基于已有 observation 立即作答。
+        时间/token 已经耗尽时不再发请求。
+        """
+        if self.budget.exhausted():
+            self.tracer.log(f"{label}.stop", reason="budget_exhausted", **ctx)
+            return None
+        memory.add({"role": "developer", "content": note})
+        resp = self.budget.respond(
+            self.llm,
+            charge_state,
+            input_items=memory.snapshot(),
+            tools=tools if tools is not None else TOOLS_SCHEMA,
+            tool_choice="none",
+        )
+        text = self._extract_text(resp)
+        self.tracer.log(f"{label}.text", step="forced", text=text[:200], **ctx)
+        return text or None
 
     # --------- helpers ----------
     def _item_get(self, item: Any, key: str, default: Any = None) -> Any:
@@ -161,10 +631,46 @@ class AgentFSM:
         self.user_query = user_query
         self.decision = None
         self.plan_steps = []
+        self._pipeline = None
         self.memory = Memory()
         self.final_answer = None
+        self.exec_step = 0
+        self.step_results = {}
+        self.substeps = {}
         self.tracer.log("fsm.reset", query=user_query[:200])
 
+    # --------- checkpoint ----------
+    def _checkpoint(self, reason: str) -> None:
+        if self.checkpoint_store is None:
+            return
+        with self._ckpt_lock:
+            record = {
+                "run_id": self.run_id,
+                "reason": reason,
+                "state": self.state.value,
+                "user_query": self.user_query,
+                "decision": asdict(self.decision) if self.decision else None,
+                "plan_steps": [asdict(s) for s in self.plan_steps],
+                "step_results": {str(k): v for k, v in self.step_results.items()},
+                "substeps": {str(k): v for k, v in self.substeps.items()},
+                "memory": self.memory.snapshot(),
+                "exec_step": self.exec_step,
+                "final_answer": self.final_answer,
+            }
+            self.checkpoint_store.append(self.run_id, record)
+
+    def _restore(self, record: Dict[str, Any]) -> None:
+        self._reset(record["user_query"])
+        self.run_id = record["run_id"]
+        self.state = State(record["state"])
+        self.decision = RouteDecision(**record["decision"]) if record.get("decision") else None
+        self.plan_steps = [PlanStep(**s) for s in record.get("plan_steps") or []]
+        self.step_results = {int(k): v for k, v in (record.get("step_results") or {}).items()}
+        self.substeps = {int(k): v for k, v in (record.get("substeps") or {}).items()}
+        self.memory.extend(record.get("memory") or [])
+        self.exec_step = int(record.get("exec_step") or 0)
+        self.final_answer = record.get("final_answer")
+
     def _extract_tool_calls(self, resp) -> List[Dict[str, Any]]:
         calls = []
         for item in getattr(resp, "output", []) or []:
@@ -201,18 +707,23 @@ class AgentFSM:
 
         self.tracer.log("tool.call", name=tool_name, args=args, call_id=call_id)
 
-        fn = TOOL_REGISTRY.get(tool_name)
-        if not fn:
-            output = json.dumps({"ok": False, "error": f"unknown tool: {tool_name}"}, ensure_ascii=False)
-        else:
-            try:
-                output = fn(**args)
-            except TypeError as e:
-                output = json.dumps({"ok": False, "error": f"bad args: {e}"}, ensure_ascii=False)
-            except Exception as e:
-                output = json.dumps({"ok": False, "error": f"tool failed: {type(e).__name__}: {e}"}, ensure_ascii=False)
-
-        self.tracer.log("tool.result", name=tool_name, call_id=call_id, output=output)
+        with self.tracer.span("span.tool", name=tool_name, call_id=call_id):
+            fn = TOOL_REGISTRY.get(tool_name)
+            if not fn:
+                output = json.dumps({"ok": False, "error": f"unknown tool: {tool_name}"}, ensure_ascii=False)
+            else:
+                try:
+                    output = fn(**args)
+                except TypeError as e:
+                    output = json.dumps({"ok": False, "error": f"bad args: {e}"}, ensure_ascii=False)
+                except Exception as e:
+                    output = json.dumps({"ok": False, "error": f"tool failed: {type(e).__name__}: {e}"}, ensure_ascii=False)
+
+        # 大 observation 旁路存储：memory / trace 里只留预览 + handle（read_observation 自己的分页结果不再旁路）
+        handle = None
+        if tool_name != "read_observation":
+            output, handle = get_blob_store().offload(output)
+        self.tracer.log("tool.result", name=tool_name, call_id=call_id, output=output, blob=handle)
 
         output_type = "function_call_output" if call_type == "function_call" else "tool_output"
         return {"type": output_type, "call_id": call_id, "output": output}
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from typing import Optional, Tuple
+
+class BlobStore:
+    """
+    大 observation 的旁路存储：内容寻址（sha256），相同内容只存一份。
+    Memory / Tracer 里只放预览 + handle，模型需要时用 read_observation 按需分页读取。
+    """
+    def __init__(self, root: str = ".agent_blobs", threshold: int = 4096, preview_chars: int = 800) -> None:
+        self.root = root
+        self.threshold = threshold          # 超过多少字节才旁路存储
+        self.preview_chars = preview_chars  # 留在 memory 里的预览长度
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再 rename，并发写同一个 blob 也不会读到半截
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return f"blob:{digest}"
+
+    def size(self, handle: str) -> int:
+        return os.path.getsize(self._path(self._digest(handle)))
+
+    def read(self, handle: str, offset: int = 0, length: int = 2000) -> Tuple[str, int, int, int]:
+        """
+        按字节区间读取（mmap，不把整个 blob 读进内存），返回 (文本, 实际起点, 实际终点, 总字节数)。
+        区间对齐到 UTF-8 字符边界：起点落在字符中间时往前退到字符开头，终点往前收到最后一个完整字符，
+        所以下一页从返回的终点开始读，不会丢字符。
+        """
+        path = self._path(self._digest(handle))
+        with open(path, "rb") as f:
+            total = os.fstat(f.fileno()).st_size
+            if total == 0:
+                return "", 0, 0, 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                start = min(max(0, offset), total)
+                while 0 < start < total and _is_continuation(m[start]):
+                    start -= 1
+                end = min(total, start + max(0, length))
+                while start < end < total and _is_continuation(m[end]):
+                    end -= 1
+                if end == start and start < total:
+                    # length 比一个字符还短：至少给出一个完整字符，保证分页能往前走
+                    end = start + 1
+                    while end < total and _is_continuation(m[end]):
+                        end += 1
+                chunk = m[start:end]
+        return chunk.decode("utf-8", errors="replace"), start, end, total
+
+    def _digest(self, handle: str) -> str:
+        digest = handle[len("blob:"):] if handle.startswith("blob:") else handle
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            raise ValueError(f"bad handle: {handle}")
+        return digest
+
+    def offload(self, output: str) -> Tuple[str, Optional[str]]:
+        """
+        observation 太大时存进 blob，返回 (写进 memory 的预览文本, handle)；否则原样返回。
+        """
+        if len(output.encode("utf-8")) <= self.threshold:
+            return output, None
+        handle = self.put(output)
+        head = output[: self.preview_chars]
+        # 预览按字符截，read_observation 按字节读：把预览结束的字节位置告诉模型
+        preview_end = len(head.encode("utf-8"))
+        preview = json.dumps({
+            "ok": True,
+            "truncated": True,
+            "handle": handle,
+            "total_bytes": len(output.encode("utf-8")),
+            "preview": head,
+            "preview_end_offset": preview_end,
+            "hint": f"Call read_observation(handle, offset={preview_end}, length) to read the rest of this result.",
+        }, ensure_ascii=False)
+        return preview, handle
+
+def _is_continuation(byte: int) -> bool:
+    # UTF-8 后续字节：10xxxxxx
+    return byte & 0xC0 == 0x80
+
+_store = BlobStore(root=os.environ.get("AGENT_BLOB_DIR", ".agent_blobs"))
+
+def get_blob_store() -> BlobStore:
+    return _store
+
+def set_blob_store(store: BlobStore) -> None:
+    global _store
+    _store = store
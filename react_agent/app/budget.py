@@ -0,0 +1,183 @@
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, Optional
+
+import openai
+
+from .ratelimit import PRIORITY_IN_FLIGHT, PRIORITY_NEW, estimate_tokens
+from .responses import get_field, has_usage, output_text, usage_tokens
+
+# 单次调用超出剩余时间：请求本身超时，或者在限流器里排队超时（RateLimitTimeout 是 TimeoutError）
+_TIMEOUTS = (openai.APITimeoutError, TimeoutError)
+
+class DeadlineExceeded(Exception):
+    """LLM 调用在 deadline 内没完成；state 是超时发生的阶段，由 AgentFSM 降级收尾。"""
+    def __init__(self, state: str) -> None:
+        super().__init__(f"deadline exceeded in {state}")
+        self.state = state
+
+def _request_estimate(kwargs: Dict[str, Any], output_tokens: int) -> int:
+    return estimate_tokens(kwargs.get("input_items") or [], kwargs.get("tools"), output_tokens=output_tokens)
+
+class RunBudget:
+    """
+    单次 run 的时间/Token 预算：
+    - deadline：绝对截止时间（monotonic），每次 LLM 调用都用剩余时间作为 timeout
+    - max_tokens：token 上限，按 resp.usage 扣减
+    - 按 FSM state 记录消耗（calls / tokens / seconds），方便看钱和时间花在哪
+    None 表示不限制。sub-executor 会并发 charge，所以内部加锁。
+    传了 tracer 时每次调用记一个 span.llm，供 timeline 导出。
+    """
+    def __init__(self, deadline_s: Optional[float] = None, max_tokens: Optional[int] = None, tracer: Any = None) -> None:
+        self.tracer = tracer
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_s if deadline_s is not None else None
+        self.max_tokens = max_tokens
+        self.used_tokens = 0
+        self.calls = 0
+        self.call_seconds = 0.0
+        self.by_state: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return self.deadline is not None or self.max_tokens is not None
+
+    def remaining_time(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def remaining_tokens(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.used_tokens)
+
+    def timeout(self) -> Optional[float]:
+        """给 LLM.respond 用的剩余时间 timeout。"""
+        return self.remaining_time()
+
+    def exhausted(self) -> bool:
+        t = self.remaining_time()
+        k = self.remaining_tokens()
+        return (t is not None and t <= 0) or (k is not None and k <= 0)
+
+    def avg_call_seconds(self) -> float:
+        return self.call_seconds / self.calls if self.calls else 0.0
+
+    def avg_call_tokens(self) -> float:
+        return self.used_tokens / self.calls if self.calls else 0.0
+
+    def rounds_left(self, reserve_s: float = 0.0) -> Optional[int]:
+        """
+        按已观测的平均单次调用耗时/token 估算还能跑几轮工具调用（预留一次 final 的余量）。
+        还没有观测数据时返回 None，由调用方按 max_steps 跑。
+        """
+        if not self.limited or not self.calls:
+            return None
+        caps = []
+        t = self.remaining_time()
+        avg_s = self.avg_call_seconds()
+        if t is not None and avg_s > 0:
+            caps.append(int((t - reserve_s - avg_s) // avg_s))
+        k = self.remaining_tokens()
+        avg_k = self.avg_call_tokens()
+        if k is not None and avg_k > 0:
+            caps.append(int((k - avg_k) // avg_k))
+        if not caps:
+            return None
+        return max(0, min(caps))
+
+    def priority(self) -> int:
+        """限流排队优先级：run 的第一次调用算新准入，之后都算 in-flight。"""
+        return PRIORITY_IN_FLIGHT if self.calls else PRIORITY_NEW
+
+    def respond(self, llm: Any, state: str, **kwargs: Any) -> Any:
+        """
+        带预算的 LLM 调用：剩余时间作为 timeout 透传给 LLM.respond，返回后按 state 记账。
+        """
+        span = self.tracer.span("span.llm", state=state) if self.tracer is not None else nullcontext({})
+        with span as sp:
+            start = time.monotonic()
+            try:
+                resp = llm.respond(timeout=self.timeout(), priority=self.priority(), **kwargs)
+            except _TIMEOUTS as e:
+                self.charge(state, None, time.monotonic() - start, estimate=_request_estimate(kwargs, 0))
+                self.record_timeout(state)
+                sp["timeout"] = True
+                raise DeadlineExceeded(state) from e
+            self.charge(state, resp, time.monotonic() - start)
+            sp["tokens"] = usage_tokens(resp)
+        return resp
+
+    def stream(self, llm: Any, state: str, **kwargs: Any) -> Iterator[str]:
+        """
+        带预算的流式调用：逐段产出文本 delta，结束（或调用方提前 close）时记账。
+        LLM 不支持 stream 时退化为一次 respond，整段文本作为一个 delta。
+        超时和 respond 一样转成 DeadlineExceeded。
+        """
+        span = self.tracer.span("span.llm", state=state, stream=True) if self.tracer is not None else nullcontext({})
+        with span as sp:
+            start = time.monotonic()
+            resp: Any = None
+            streamed = 0
+            try:
+                if not hasattr(llm, "stream"):
+                    resp = llm.respond(timeout=self.timeout(), priority=self.priority(), **kwargs)
+                    yield output_text(resp)
+                    return
+                events = llm.stream(timeout=self.timeout(), priority=self.priority(), **kwargs)
+                try:
+                    for event in events:
+                        etype = get_field(event, "type")
+                        if etype == "response.output_text.delta":
+                            delta = get_field(event, "delta", "")
+                            if delta:
+                                streamed += len(delta)
+                                yield delta
+                        elif etype in ("response.completed", "response.done"):
+                            resp = get_field(event, "response")
+                finally:
+                    close = getattr(events, "close", None)
+                    if close:
+                        close()
+            except _TIMEOUTS as e:
+                self.record_timeout(state)
+                sp["timeout"] = True
+                raise DeadlineExceeded(state) from e
+            finally:
+                # 提前 close（router 拿到字段就停）时收不到 response.completed，没有 usage，
+                # 但请求照样计费：按输入 + 已收到的输出估算
+                estimate = _request_estimate(kwargs, streamed // 4)
+                self.charge(state, resp, time.monotonic() - start, estimate=estimate)
+                sp["tokens"] = usage_tokens(resp) if has_usage(resp) else estimate
+
+    def charge(self, state: str, resp: Any, seconds: float, estimate: int = 0) -> None:
+        """按 resp.usage 记账；没有 usage（流被提前关闭 / 超时）时用 estimate。"""
+        tokens = usage_tokens(resp) if has_usage(resp) else estimate
+        with self._lock:
+            self.used_tokens += tokens
+            self.calls += 1
+            self.call_seconds += seconds
+            rec = self._state_rec(state)
+            rec["calls"] += 1
+            rec["tokens"] += tokens
+            rec["seconds"] += seconds
+
+    def record_timeout(self, state: str) -> None:
+        # 调用本身已经按 charge 记过（时间照算），这里只按 state 计超时次数
+        with self._lock:
+            self._state_rec(state)["timeouts"] += 1
+
+    def _state_rec(self, state: str) -> Dict[str, float]:
+        return self.by_state.setdefault(state, {"calls": 0, "tokens": 0, "seconds": 0.0, "timeouts": 0})
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "elapsed_s": round(time.monotonic() - self.started, 3),
+            "remaining_s": None if self.deadline is None else round(self.remaining_time() or 0.0, 3),
+            "used_tokens": self.used_tokens,
+            "remaining_tokens": self.remaining_tokens(),
+            "by_state": {k: {**v, "seconds": round(v["seconds"], 3)} for k, v in self.by_state.items()},
+        }
@@ -0,0 +1,102 @@
+"""
+AgentFSM 的 checkpoint 存储：每次状态转移 / 每轮工具调用后追加一条快照，
+worker 挂掉后用 AgentFSM.resume(run_id) 从最后一条接着跑，不重复已经付过钱的调用。
+两种实现都是 append-only：只追加，不原地改，读的时候取最后一条完整记录。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+class CheckpointStore(ABC):
+    @abstractmethod
+    def append(self, run_id: str, record: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def latest(self, run_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def runs(self) -> List[str]:
+        ...
+
+class FileCheckpointStore(CheckpointStore):
+    """每个 run 一个 JSONL 文件；最后一行写到一半（进程被杀）时跳过它。"""
+    def __init__(self, root: str = ".agent_checkpoints") -> None:
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, run_id: str) -> str:
+        safe = "".join(c for c in run_id if c.isalnum() or c in "-_")
+        return os.path.join(self.root, f"{safe}.jsonl")
+
+    def append(self, run_id: str, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self._path(run_id), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def latest(self, run_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(run_id), encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+        for line in reversed(lines):
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                continue
+        return None
+
+    def runs(self) -> List[str]:
+        return sorted(n[:-len(".jsonl")] for n in os.listdir(self.root) if n.endswith(".jsonl"))
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """单表 append-only（WAL），适合很多 run 共用一个文件。"""
+    def __init__(self, path: str = "agent_checkpoints.db") -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # 和 JobQueue 一样等 30s 写锁：fleet 里多个 worker 进程共用这个文件，默认的 5s 在高并发下会 "database is locked"
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " run_id TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_run ON checkpoints(run_id, seq)")
+
+    def append(self, run_id: str, record: Dict[str, Any]) -> None:
+        payload = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO checkpoints(run_id, ts, payload) VALUES (?, ?, ?)",
+                (run_id, time.time(), payload),
+            )
+
+    def latest(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM checkpoints WHERE run_id = ? ORDER BY seq DESC LIMIT 1",
+                (run_id,),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def runs(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT run_id FROM checkpoints ORDER BY run_id").fetchall()
+        return [r[0] for r in rows]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,292 @@
+"""
+单机多进程 worker fleet：query 进 SQLite 任务队列（jobqueue.py），N 个 worker 进程各自跑 AgentFSM。
+- worker 领 job 时拿租约，跑的过程中后台线程心跳续约；进程挂了租约过期，别的 worker 重新领走
+- checkpoint 和队列共用一个 SQLite 文件，重试时从上次的 checkpoint resume，不重复已完成的调用
+- 心跳发现租约被别人拿走时，本地的 run 在下一次 trace 时中断，不和新 owner 同时跑
+- 结果 / 错误 / trace 写回 jobs 表
+- supervisor 按 fleet 表里的期望 worker 数扩缩容；缩容时 worker 跑完手上的 job 再退出
+
+  python -m react_agent.app.fleet enqueue "法国的首都是哪里？" "算一下 12*34"
+  python -m react_agent.app.fleet start --workers 4 --stub-latency 0.2
+  python -m react_agent.app.fleet scale 8
+  python -m react_agent.app.fleet status
+  python -m react_agent.app.fleet result 1 --trace
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Dict, Optional
+
+from .agent_fsm import AgentFSM
+from .checkpoint import SQLiteCheckpointStore
+from .jobqueue import Job, JobQueue
+from .llm import LLM
+from .trace import Tracer
+
+DEFAULT_DB = "agent_jobs.db"
+
+# --------- worker 进程 ----------
+class LeaseLost(Exception):
+    """心跳发现租约已经被别的 worker 拿走，在下一次 trace 时中断本地的 run。"""
+
+class _JobTracer(Tracer):
+    """lost 被置位后下一次 log 抛 LeaseLost（和 server 的 _ServerTracer 一样协作式取消）。"""
+    def __init__(self, lost: threading.Event) -> None:
+        super().__init__()
+        self.lost = lost
+
+    def log(self, kind: str, **data: Any) -> None:
+        if self.lost.is_set():
+            raise LeaseLost(kind)
+        super().log(kind, **data)
+
+def _heartbeat_loop(db_path: str, job_id: int, worker_id: str, lease_s: float, done: threading.Event, lost: threading.Event) -> None:
+    # sqlite 连接不能跨线程用，心跳线程自己开一个
+    queue = JobQueue(db_path)
+    try:
+        while not done.wait(lease_s / 3):
+            queue.touch_worker(worker_id, current_job=job_id)
+            if not queue.heartbeat(job_id, worker_id, lease_s):
+                lost.set()
+                return
+    finally:
+        queue.close()
+
+def _run_job(queue: JobQueue, store: SQLiteCheckpointStore, llm: Any, job: Job, worker_id: str, lease_s: float) -> None:
+    done = threading.Event()
+    lost = threading.Event()
+    hb = threading.Thread(
+        target=_heartbeat_loop, args=(queue.path, job.id, worker_id, lease_s, done, lost),
+        name=f"heartbeat-{job.id}", daemon=True,
+    )
+    hb.start()
+    tracer = _JobTracer(lost)
+    run_id = f"job-{job.id}"
+    tracer.log("fleet.job", job_id=job.id, worker=worker_id, attempt=job.attempts)
+    try:
+        agent = AgentFSM(llm=llm, tracer=tracer, checkpoint_store=store)
+        if job.attempts > 1 and store.latest(run_id) is not None:
+            answer = agent.resume(run_id)
+        else:
+            answer = agent.run(job.query, run_id=run_id)
+    except LeaseLost as e:
+        # job 已经被别的 worker 接手：不再发请求，也不 complete / fail，结果以那边为准
+        print(f"[{worker_id}] lease lost for job {job.id}, cancelled at {e}", file=sys.stderr)
+        return
+    except Exception as e:
+        if lost.is_set():
+            # 出错时租约也已经丢了，这里的 fail 不会生效，tracer.log 也会抛 LeaseLost
+            return
+        tracer.log("fleet.job_error", job_id=job.id, error=repr(e))
+        queue.fail(job.id, worker_id, error=traceback.format_exc(), trace=tracer.dump_json())
+        return
+    finally:
+        done.set()
+        hb.join()
+    if not queue.complete(job.id, worker_id, result=answer, trace=tracer.dump_json()):
+        # 租约丢了（心跳太慢 / 被判定超时），job 已经被别的 worker 接手，结果以那边为准
+        print(f"[{worker_id}] lease lost for job {job.id} (heartbeat_lost={lost.is_set()})", file=sys.stderr)
+
+def worker_main(db_path: str, worker_id: str, lease_s: float, poll_s: float, model: str, stub_latency: Optional[float]) -> None:
+    stopping = threading.Event()
+    # SIGTERM：跑完当前 job 再退；SIGINT 交给 supervisor 统一处理
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    queue = JobQueue(db_path)
+    store = SQLiteCheckpointStore(db_path)
+    if stub_latency is not None:
+        from .server import StubLLM
+        llm: Any = StubLLM(latency_s=stub_latency)
+    else:
+        llm = LLM(model=model)
+    try:
+        while not stopping.is_set():
+            if queue.touch_worker(worker_id) != "running":
+                break
+            job = queue.claim(worker_id, lease_s)
+            if job is None:
+                stopping.wait(poll_s)
+                continue
+            _run_job(queue, store, llm, job, worker_id, lease_s)
+            queue.touch_worker(worker_id, done=1)
+    finally:
+        queue.set_worker_status(worker_id, "stopped")
+        queue.close()
+        store.close()
+
+# --------- supervisor ----------
+class Fleet:
+    """
+    supervisor：维持期望数量的 worker 进程，回收挂掉的进程并补上。
+    一个队列文件同时只跑一个 supervisor。
+    """
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB,
+        workers: int = 2,
+        lease_s: float = 30.0,
+        poll_s: float = 0.5,
+        model: str = "gpt-4.1-mini",
+        stub_latency: Optional[float] = None,
+    ) -> None:
+        self.db_path = db_path
+        self.workers = workers
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self.model = model
+        self.stub_latency = stub_latency
+        self.queue = JobQueue(db_path)
+        # spawn：子进程不继承父进程的 sqlite 连接
+        self.ctx = mp.get_context("spawn")
+        self.procs: Dict[str, Any] = {}
+
+    def _spawn(self) -> None:
+        worker_id = f"w-{uuid.uuid4().hex[:8]}"
+        # 先登记再启动，worker 第一次 touch 就能看到 running
+        self.queue.register_worker(worker_id)
+        p = self.ctx.Process(
+            target=worker_main,
+            args=(self.db_path, worker_id, self.lease_s, self.poll_s, self.model, self.stub_latency),
+            name=worker_id,
+            daemon=False,
+        )
+        p.start()
+        self.queue.set_worker_pid(worker_id, p.pid)
+        self.procs[worker_id] = p
+        print(f"started {worker_id} pid={p.pid}")
+
+    def _reap(self) -> None:
+        for worker_id, p in list(self.procs.items()):
+            if p.is_alive():
+                continue
+            p.join()
+            self.queue.set_worker_status(worker_id, "stopped")
+            del self.procs[worker_id]
+            print(f"{worker_id} exited code={p.exitcode}")
+
+    def reconcile(self) -> None:
+        self._reap()
+        desired = self.queue.desired_workers(self.workers)
+        status = {w["id"]: w["status"] for w in self.queue.workers()}
+        active = [wid for wid in self.procs if status.get(wid) == "running"]
+        for _ in range(desired - len(active)):
+            self._spawn()
+        # 缩容：后启动的先停
+        for worker_id in active[desired:] if len(active) > desired else []:
+            self.queue.set_worker_status(worker_id, "stopping")
+            print(f"stopping {worker_id}")
+
+    def run(self) -> None:
+        # SIGTERM 和 Ctrl-C 一样走优雅退出
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.queue.stop_stale_workers()
+        self.queue.set_desired_workers(self.workers)
+        try:
+            while True:
+                self.reconcile()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        for worker_id in self.procs:
+            self.queue.set_worker_status(worker_id, "stopping")
+        deadline = time.monotonic() + self.lease_s
+        for p in self.procs.values():
+            p.join(timeout=max(0.0, deadline - time.monotonic()))
+        for worker_id, p in self.procs.items():
+            if p.is_alive():
+                # 手上的 job 不 fail：租约过期后会被重新领走，并从 checkpoint 接着跑
+                p.terminate()
+                p.join()
+            self.queue.set_worker_status(worker_id, "stopped")
+        self.procs.clear()
+        self.queue.close()
+
+# --------- CLI ----------
+def _print_status(queue: JobQueue) -> None:
+    counts = queue.counts()
+    print("jobs: " + " ".join(f"{k}={counts.get(k, 0)}" for k in ("queued", "running", "done", "failed")))
+    print(f"desired_workers: {queue.desired_workers(0)}")
+    now = time.time()
+    for w in queue.workers():
+        if w["status"] == "stopped":
+            continue
+        seen = f"{now - w['last_seen']:.1f}s ago" if w["last_seen"] else "-"
+        print(f"  {w['id']} pid={w['pid']} {w['status']} jobs_done={w['jobs_done']} current_job={w['current_job']} last_seen={seen}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run AgentFSM jobs on a local multi-process worker fleet.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite file shared by the job queue and checkpoints")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("enqueue", help="add queries to the queue")
+    p.add_argument("queries", nargs="*")
+    p.add_argument("--file", default=None, help="one query per line")
+    p.add_argument("--max-attempts", type=int, default=3)
+
+    p = sub.add_parser("start", help="run the supervisor in the foreground")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--lease", type=float, default=30.0, help="lease seconds; heartbeats renew every lease/3")
+    p.add_argument("--poll", type=float, default=0.5, help="idle poll interval in seconds")
+    p.add_argument("--model", default="gpt-4.1-mini")
+    p.add_argument("--stub-latency", type=float, default=None, help="use StubLLM with this latency (seconds) instead of the API")
+
+    p = sub.add_parser("scale", help="change the number of workers of a running fleet")
+    p.add_argument("workers", type=int)
+
+    sub.add_parser("status", help="show job counts and live workers")
+
+    p = sub.add_parser("result", help="show a job's result")
+    p.add_argument("job_id", type=int)
+    p.add_argument("--trace", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.cmd == "start":
+        Fleet(
+            db_path=args.db,
+            workers=args.workers,
+            lease_s=args.lease,
+            poll_s=args.poll,
+            model=args.model,
+            stub_latency=args.stub_latency,
+        ).run()
+        return
+
+    queue = JobQueue(args.db)
+    try:
+        if args.cmd == "enqueue":
+            queries = list(args.queries)
+            if args.file:
+                with open(args.file, encoding="utf-8") as f:
+                    queries.extend(line.strip() for line in f if line.strip())
+            for q in queries:
+                print(queue.enqueue(q, max_attempts=args.max_attempts))
+        elif args.cmd == "scale":
+            queue.set_desired_workers(args.workers)
+        elif args.cmd == "status":
+            _print_status(queue)
+        elif args.cmd == "result":
+            job = queue.get(args.job_id)
+            if job is None:
+                sys.exit(f"no job {args.job_id}")
+            trace = job.pop("trace")
+            print(json.dumps(job, ensure_ascii=False, indent=2))
+            if args.trace and trace:
+                print(trace)
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()
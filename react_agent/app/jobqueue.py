@@ -0,0 +1,178 @@
+"""
+本地 SQLite（WAL）任务队列，给多进程 worker fleet 用：
+- jobs：query / 状态 / 租约（lease）/ 结果 / trace
+- workers：每个 worker 进程的心跳和状态，supervisor 靠它扩缩容
+- fleet：期望的 worker 数（CLI scale 写，supervisor 读）
+claim 时拿租约，跑的过程中心跳续约；租约过期的 job 会被别的 worker 重新领走，超过 max_attempts 标记失败。
+"""
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',      -- queued | running | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    trace TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    pid INTEGER,
+    status TEXT NOT NULL,                       -- running | stopping | stopped
+    started_at REAL,
+    last_seen REAL,
+    jobs_done INTEGER NOT NULL DEFAULT 0,
+    current_job INTEGER
+);
+CREATE TABLE IF NOT EXISTS fleet (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+@dataclass
+class Job:
+    id: int
+    query: str
+    attempts: int
+    max_attempts: int
+
+class JobQueue:
+    def __init__(self, path: str = "agent_jobs.db") -> None:
+        self.path = path
+        # isolation_level=None：自己控制事务（claim 需要 BEGIN IMMEDIATE 抢写锁）
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # --------- jobs ----------
+    def enqueue(self, query: str, max_attempts: int = 3) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO jobs(query, max_attempts, enqueued_at) VALUES (?, ?, ?)",
+            (query, max_attempts, time.time()),
+        )
+        return int(cur.lastrowid)
+
+    def claim(self, worker_id: str, lease_s: float) -> Optional[Job]:
+        """领一个 queued 或租约已过期的 job；重试次数用完的过期 job 直接标记失败。"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired; attempts exhausted', finished_at = ?"
+                " WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = self.conn.execute(
+                "SELECT id, query, attempts, max_attempts FROM jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?)"
+                " ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?,"
+                " attempts = attempts + 1, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker_id, now + lease_s, now, row[0]),
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return Job(id=row[0], query=row[1], attempts=row[2] + 1, max_attempts=row[3])
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_s: float) -> bool:
+        """续约；返回 False 表示租约已经被别人拿走。"""
+        cur = self.conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (time.time() + lease_s, job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: str, trace: str) -> bool:
+        cur = self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, trace = ?, finished_at = ?, lease_expires = NULL"
+            " WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (result, trace, time.time(), job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str, trace: str = "") -> None:
+        """还有重试次数就放回队列，否则标记失败。"""
+        self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,"
+            " error = ?, trace = ?, lease_owner = NULL, lease_expires = NULL,"
+            " finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END"
+            " WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (error, trace, time.time(), job_id, worker_id),
+        )
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        cur = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in cur.description], row))
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    # --------- workers / fleet ----------
+    def register_worker(self, worker_id: str, pid: Optional[int] = None) -> None:
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO workers(id, pid, status, started_at, last_seen, jobs_done) VALUES (?, ?, 'running', ?, ?, 0)",
+            (worker_id, pid, now, now),
+        )
+
+    def set_worker_pid(self, worker_id: str, pid: int) -> None:
+        self.conn.execute("UPDATE workers SET pid = ? WHERE id = ?", (pid, worker_id))
+
+    def touch_worker(self, worker_id: str, current_job: Optional[int] = None, done: int = 0) -> str:
+        """worker 心跳；返回 supervisor 给它设的状态（stopping 时跑完当前 job 就退出）。"""
+        self.conn.execute(
+            "UPDATE workers SET last_seen = ?, current_job = ?, jobs_done = jobs_done + ? WHERE id = ?",
+            (time.time(), current_job, done, worker_id),
+        )
+        row = self.conn.execute("SELECT status FROM workers WHERE id = ?", (worker_id,)).fetchone()
+        return row[0] if row else "stopping"
+
+    def set_worker_status(self, worker_id: str, status: str) -> None:
+        self.conn.execute("UPDATE workers SET status = ? WHERE id = ?", (status, worker_id))
+
+    def stop_stale_workers(self) -> int:
+        """supervisor 启动时调用：上一个 supervisor 留下的 worker 记录一律视为已停止。"""
+        cur = self.conn.execute("UPDATE workers SET status = 'stopped', current_job = NULL WHERE status != 'stopped'")
+        return cur.rowcount
+
+    def workers(self) -> List[Dict[str, Any]]:
+        cur = self.conn.execute("SELECT * FROM workers ORDER BY started_at")
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def set_desired_workers(self, n: int) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO fleet(key, value) VALUES ('desired_workers', ?)", (str(n),))
+
+    def desired_workers(self, default: int) -> int:
+        row = self.conn.execute("SELECT value FROM fleet WHERE key = 'desired_workers'").fetchone()
+        return int(row[0]) if row else default
@@ -0,0 +1,113 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+class IncrementalJSONParser:
+    """
+    流式 JSON 解析：边收 token 边扫描，某个值一闭合就吐出 (path, value)。
+    只吐深度 1..emit_depth 的值，例如：
+      {"route": "react", ...}          -> (("route",), "react")
+      {"steps": [{...}, {...}]}        -> (("steps", 0), {...}), (("steps", 1), {...}), (("steps",), [...])
+    不做完整校验：结构出错的片段直接跳过，最终结果仍以完整文本 json.loads 为准。
+    """
+    def __init__(self, emit_depth: int = 2) -> None:
+        self.emit_depth = emit_depth
+        self.text = ""
+        self._i = 0
+        self._stack: List[dict] = []       # {"kind": "{"|"[", "key", "index", "expect_key", "start", "path"}
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._lit_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        self.text += chunk
+        out: List[Tuple[Path, Any]] = []
+        buf = self.text
+        while self._i < len(buf) and not self.done:
+            i = self._i
+            c = buf[i]
+            self._i += 1
+
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    top = self._stack[-1] if self._stack else None
+                    if top is not None and top["kind"] == "{" and top["expect_key"]:
+                        top["key"] = self._loads(self._str_start, i + 1)
+                    else:
+                        self._complete(self._str_start, i + 1, out)
+                continue
+
+            if self._lit_start is not None:
+                if c not in ",}] \t\r\n":
+                    continue
+                self._complete(self._lit_start, i, out)
+                self._lit_start = None
+
+            if c in " \t\r\n":
+                continue
+            if c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c in "{[":
+                self._stack.append({
+                    "kind": c,
+                    "key": None,
+                    "index": 0,
+                    "expect_key": c == "{",
+                    "start": i,
+                    "path": self._child_path(),
+                })
+            elif c in "}]":
+                if not self._stack:
+                    continue
+                frame = self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                    continue
+                self._complete(frame["start"], i + 1, out)
+            elif c == ":":
+                if self._stack:
+                    self._stack[-1]["expect_key"] = False
+            elif c == ",":
+                if self._stack:
+                    top = self._stack[-1]
+                    if top["kind"] == "{":
+                        top["expect_key"] = True
+                        top["key"] = None
+                    else:
+                        top["index"] += 1
+            else:
+                self._lit_start = i
+        return out
+
+    def _child_path(self) -> Path:
+        if not self._stack:
+            return ()
+        top = self._stack[-1]
+        return top["path"] + ((top["key"],) if top["kind"] == "{" else (top["index"],))
+
+    def _complete(self, start: int, end: int, out: List[Tuple[Path, Any]]) -> None:
+        path = self._child_path()
+        if 1 <= len(path) <= self.emit_depth:
+            try:
+                out.append((path, json.loads(self.text[start:end])))
+            except json.JSONDecodeError:
+                pass
+
+    def _loads(self, start: int, end: int) -> Any:
+        try:
+            return json.loads(self.text[start:end])
+        except json.JSONDecodeError:
+            return None
+
+def json_schema_format(name: str, schema: dict) -> dict:
+    """Responses API 的 text.format：让模型按 schema 严格输出 JSON（structured output）。"""
+    return {"format": {"type": "json_schema", "name": name, "schema": schema, "strict": True}}
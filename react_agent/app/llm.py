@@ -1,24 +1,114 @@
 import os
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import openai
 from openai import OpenAI
 
+from .ratelimit import PRIORITY_IN_FLIGHT, PRIORITY_NEW, RateLimiter, estimate_tokens, get_rate_limiter
+from .responses import get_field, usage_tokens
+
 class LLM:
     """
     对 Responses API 的轻封装：你以后要换模型、加 retries、加超时、加日志都放这里。
+    每次调用先过进程级限流器（ratelimit.py）；429 / 连接错误在这里重试，不用 SDK 自带的重试，
+    这样重试也要排队，并且能读到 retry-after。
     """
-    def __init__(self, model: str = "gpt-4.1-mini") -> None:
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def __init__(self, model: str = "gpt-4.1-mini", rate_limiter: Optional[RateLimiter] = None, max_retries: int = 3) -> None:
+        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
         self.model = model
+        # None：用进程共享的限流器（get_rate_limiter()），set_rate_limiter 之后也能生效
+        self._rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter or get_rate_limiter()
 
     def respond(
         self,
         input_items: List[Dict[str, Any]],
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_choice: str = "auto",
+        timeout: Optional[float] = None,
+        text: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_NEW,
     ):
-        return self.client.responses.create(
-            model=self.model,
-            input=input_items,
-            tools=tools,
-            tool_choice=tool_choice,
-        )
+        # timeout：调用方（RunBudget）传入的剩余时间；None 表示沿用 client 默认值
+        # text：structured output 的 format（见 jsonstream.json_schema_format）
+        # priority：PRIORITY_IN_FLIGHT 表示 run 已经在跑，限流排队时排在新 run 前面
+        request = self._request(input_items, tools, tool_choice, text)
+        raw, est = self._create(request, timeout, priority)
+        resp = raw.parse()
+        self.rate_limiter.settle(est, usage_tokens(resp))
+        return resp
+
+    def stream(
+        self,
+        input_items: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str = "auto",
+        timeout: Optional[float] = None,
+        text: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_NEW,
+    ) -> Iterator[Any]:
+        """流式调用：逐个产出 SDK 事件（response.output_text.delta / response.completed ...）。"""
+        request = self._request(input_items, tools, tool_choice, text)
+        request["stream"] = True
+        raw, est = self._create(request, timeout, priority)
+        events = raw.parse()
+        actual: Optional[int] = None
+        try:
+            for event in events:
+                if get_field(event, "type") in ("response.completed", "response.done"):
+                    actual = usage_tokens(get_field(event, "response"))
+                yield event
+        finally:
+            # 调用方提前停止读取时关掉连接，不再为剩余 token 等待
+            close = getattr(events, "close", None)
+            if close:
+                close()
+            self.rate_limiter.settle(est, actual)
+
+    # --------- internals ----------
+    def _request(
+        self,
+        input_items: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        tool_choice: str,
+        text: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        request: Dict[str, Any] = {"model": self.model, "input": input_items, "tools": tools, "tool_choice": tool_choice}
+        if text is not None:
+            request["text"] = text
+        return request
+
+    def _create(self, request: Dict[str, Any], timeout: Optional[float], priority: int):
+        """排队拿令牌后发请求；返回 (raw response, token 估计值)。timeout 同时限制排队和请求本身。"""
+        limiter = self.rate_limiter
+        est = estimate_tokens(request["input"], request.get("tools"))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        attempt = 0
+        while True:
+            limiter.acquire(est, priority, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if deadline is not None:
+                request["timeout"] = max(0.001, deadline - time.monotonic())
+            try:
+                raw = self.client.responses.with_raw_response.create(**request)
+            except openai.RateLimitError as e:
+                limiter.settle(est, 0)
+                limiter.on_429(e.response.headers)
+                if attempt >= self.max_retries:
+                    raise
+            except (openai.APIConnectionError, openai.InternalServerError):
+                limiter.settle(est, 0)
+                backoff = min(8.0, 0.5 * 2 ** attempt)
+                if attempt >= self.max_retries or (deadline is not None and deadline - time.monotonic() <= backoff):
+                    raise
+                time.sleep(backoff)
+            else:
+                limiter.observe_headers(raw.headers)
+                return raw, est
+            attempt += 1
+            # 重试时已经算 in-flight，优先于新 run
+            priority = PRIORITY_IN_FLIGHT
@@ -0,0 +1,47 @@
+"""
+工具调用死循环检测：模型反复发同一个调用（同参数、同输出），或者在两个调用之间来回切换时，
+剩下的每一轮都是一次完整的 LLM 调用，却拿不到任何新信息。
+- 第一次发现：返回 "warn"，调用方插一条 developer 消息纠正
+- 提醒之后还在重复：返回 "stop"，调用方强制 final
+指纹来自 Memory.tool_fingerprints()，所以 checkpoint 恢复后的 memory 一样能检测。
+"""
+
+from typing import List, Optional
+
+from .memory import Memory
+
+def repeating_period(fps: List[str], max_period: int = 2, min_repeats: int = 2) -> Optional[int]:
+    """
+    末尾是否由长度 ≤ max_period 的片段重复 min_repeats 次构成：
+    period=1 是 A A，period=2 是 A B A B。返回最短周期，没有返回 None。
+    """
+    for p in range(1, max_period + 1):
+        n = p * min_repeats
+        if len(fps) < n:
+            continue
+        tail = fps[-n:]
+        if len(set(tail[:p])) == p and all(tail[i] == tail[i - p] for i in range(p, n)):
+            return p
+    return None
+
+class LoopGuard:
+    """每个 ReAct 循环（主 executor / sub-executor / ReactAgent.run）各用一个实例。"""
+    def __init__(self, max_period: int = 2, min_repeats: int = 2) -> None:
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+        self.period: Optional[int] = None
+        self._warned_at: Optional[int] = None   # 提醒时已有的指纹数
+
+    def check(self, memory: Memory) -> Optional[str]:
+        fps = memory.tool_fingerprints()
+        self.period = repeating_period(fps, self.max_period, self.min_repeats)
+        if self.period is None:
+            # 模型换了调用，重新开始计
+            self._warned_at = None
+            return None
+        if self._warned_at is None:
+            self._warned_at = len(fps)
+            return "warn"
+        if len(fps) > self._warned_at:
+            return "stop"
+        return None
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Any, Dict, List
 
 class Memory:
@@ -18,3 +20,30 @@ class Memory:
 
     def snapshot(self) -> List[Dict[str, Any]]:
         return list(self.items)
+
+    def tool_fingerprints(self) -> List[str]:
+        """
+        按调用顺序给每次工具调用算指纹：(tool, 规范化后的参数, 输出) 的哈希。
+        参数按 key 排序，空白/顺序不同的同一调用指纹相同；还没有输出的调用不算。
+        """
+        calls: Dict[str, str] = {}
+        fps: List[str] = []
+        for item in self.items:
+            kind = item.get("type") if isinstance(item, dict) else None
+            if kind in ("function_call", "tool_call"):
+                calls[item.get("call_id") or ""] = f"{item.get('name')}\x00{_canonical_args(item.get('arguments'))}"
+            elif kind in ("function_call_output", "tool_output"):
+                call = calls.pop(item.get("call_id") or "", None)
+                if call is None:
+                    continue
+                raw = f"{call}\x00{item.get('output')}"
+                fps.append(hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16])
+        return fps
+
+def _canonical_args(arguments: Any) -> str:
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments or "{}")
+        except json.JSONDecodeError:
+            return arguments.strip()
+    return json.dumps(arguments, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
@@ -1,7 +1,9 @@
 import json
-from dataclasses import dataclass
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
 
+from .budget import RunBudget
+from .jsonstream import IncrementalJSONParser, json_schema_format
 from .llm import LLM
 from .trace import Tracer
 from .prompts import PLANNER_SYSTEM
@@ -11,6 +13,7 @@ class PlanStep:
     id: int
     goal: str
     tool_hint: str = ""
+    depends_on: List[int] = field(default_factory=list)
 
 def _safe_parse_json(text: str) -> Dict[str, Any]:
     try:
@@ -18,49 +21,117 @@ def _safe_parse_json(text: str) -> Dict[str, Any]:
     except Exception:
         return {}
 
-def _item_get(item: Any, key: str, default: Any = None) -> Any:
-    if isinstance(item, dict):
-        return item.get(key, default)
-    return getattr(item, key, default)
+# 严格 schema：steps 逐个生成，每个 step 一闭合就能开始执行
+PLANNER_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "goal": {"type": "string"},
+                    "tool_hint": {"type": "string"},
+                    "depends_on": {"type": "array", "items": {"type": "integer"}},
+                },
+                "required": ["id", "goal", "tool_hint", "depends_on"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["steps"],
+    "additionalProperties": False,
+}
 
-def plan(llm: LLM, tracer: Tracer, user_query: str) -> List[PlanStep]:
-    resp = llm.respond(
+def _to_step(s: Any, known: Dict[int, PlanStep]) -> Optional[PlanStep]:
+    """校验单个 step；依赖只保留已经出现过的 step（流式时后面的 step 还不存在）。"""
+    if not isinstance(s, dict):
+        return None
+    sid = s.get("id")
+    goal = s.get("goal")
+    tool_hint = s.get("tool_hint", "") or ""
+    deps = s.get("depends_on", []) or []
+    if not isinstance(sid, int) or sid in known or not isinstance(goal, str) or not goal.strip():
+        return None
+    if not isinstance(deps, list):
+        deps = []
+    deps = [d for d in deps if isinstance(d, int) and d != sid and d in known]
+    return PlanStep(id=sid, goal=goal.strip(), tool_hint=str(tool_hint).strip(), depends_on=deps)
+
+def plan_stream(llm: LLM, tracer: Tracer, user_query: str, budget: Optional[RunBudget] = None) -> Iterator[PlanStep]:
+    """
+    流式 planner：structured output 边生成边解析，每个 step 解码完成就 yield，
+    调用方可以在后面的 step 还在生成时就开始执行前面的。
+    """
+    budget = budget or RunBudget(tracer=tracer)
+    parser = IncrementalJSONParser()
+    known: Dict[int, PlanStep] = {}
+    deltas = budget.stream(
+        llm,
+        "PLAN",
         input_items=[
             {"role": "system", "content": PLANNER_SYSTEM},
             {"role": "user", "content": user_query},
         ],
         tools=None,
         tool_choice="none",
+        text=json_schema_format("plan", PLANNER_SCHEMA),
     )
+    try:
+        for delta in deltas:
+            for path, value in parser.feed(delta):
+                if len(path) == 2 and path[0] == "steps":
+                    step = _to_step(value, known)
+                    if step:
+                        known[step.id] = step
+                        yield step
+    finally:
+        deltas.close()
 
-    # 抽文本
-    chunks: List[str] = []
-    for item in getattr(resp, "output", []) or []:
-        if _item_get(item, "type") in ("message", "output_text"):
-            content = _item_get(item, "content")
-            if isinstance(content, str):
-                chunks.append(content)
-            elif isinstance(content, list):
-                for c in content:
-                    if _item_get(c, "type") in ("output_text", "text"):
-                        chunks.append(_item_get(c, "text", ""))
-    raw = "\n".join([c for c in chunks if c.strip()]).strip()
+    raw = parser.text.strip()
     tracer.log("planner.raw", raw=raw[:600])
 
-    data = _safe_parse_json(raw)
-    steps_data = data.get("steps", [])
-    steps: List[PlanStep] = []
-    if isinstance(steps_data, list):
-        for s in steps_data:
-            if not isinstance(s, dict):
-                continue
-            sid = s.get("id")
-            goal = s.get("goal")
-            tool_hint = s.get("tool_hint", "") or ""
-            if isinstance(sid, int) and isinstance(goal, str) and goal.strip():
-                steps.append(PlanStep(id=sid, goal=goal.strip(), tool_hint=str(tool_hint).strip()))
+    if not known:
+        # 没走 structured output（或流被截断）时按整段文本再试一次
+        data = _safe_parse_json(raw)
+        steps_data = data.get("steps", []) if isinstance(data, dict) else []
+        if isinstance(steps_data, list):
+            for s in steps_data:
+                step = _to_step(s, known)
+                if step:
+                    known[step.id] = step
+                    yield step
+        if not known:
+            tracer.log("planner.parse_error", raw=raw[:600])
+
+def finalize_plan(tracer: Tracer, steps: List[PlanStep]) -> List[PlanStep]:
     if not steps:
         steps = [PlanStep(id=1, goal="Solve the user's request", tool_hint="")]
-
-    tracer.log("planner.steps", steps=[{"id": x.id, "goal": x.goal, "tool_hint": x.tool_hint} for x in steps])
+    tracer.log(
+        "planner.steps",
+        steps=[{"id": x.id, "goal": x.goal, "tool_hint": x.tool_hint, "depends_on": x.depends_on} for x in steps],
+    )
     return steps
+
+def plan(llm: LLM, tracer: Tracer, user_query: str, budget: Optional[RunBudget] = None) -> List[PlanStep]:
+    return finalize_plan(tracer, list(plan_stream(llm, tracer, user_query, budget=budget)))
+
+def plan_levels(steps: List[PlanStep]) -> List[List[PlanStep]]:
+    """
+    按依赖把 steps 分层（Kahn 拓扑排序）：同一层内的 step 互不依赖，可以并行执行。
+    层数就是关键路径长度。有环时返回 []，调用方退回顺序执行。
+    """
+    by_id = {s.id: s for s in steps}
+    remaining = {s.id: set(d for d in s.depends_on if d in by_id) for s in steps}
+    levels: List[List[PlanStep]] = []
+    while remaining:
+        ready = sorted(sid for sid, deps in remaining.items() if not deps)
+        if not ready:
+            return []
+        levels.append([by_id[sid] for sid in ready])
+        for sid in ready:
+            del remaining[sid]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return levels
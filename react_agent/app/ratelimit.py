@@ -0,0 +1,225 @@
+"""
+进程级客户端限流：同一进程里所有 LLM 实例共用一个 RateLimiter（get_rate_limiter()）。
+- 两个令牌桶：每分钟请求数（RPM）和每分钟 token 数（TPM）；token 按请求体粗估，返回后按 usage 多退少补
+- 响应头 x-ratelimit-* 自调：limit-* 更新桶容量，remaining-* 把本地余量往下压（同一个 key 可能还有别的进程在用）
+- 429 时按 retry-after-ms / retry-after 暂停整个限流器
+- 排队按优先级：已经在跑的 run（后续轮次、429 重试）优先于新 run 的第一次调用
+- stats() 给出排队等待时间分位、当前排队数、429 次数，server 的 /metrics 会带上
+
+初始值可以用环境变量 OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT 覆盖，之后以响应头为准。
+"""
+
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+PRIORITY_IN_FLIGHT = 0
+PRIORITY_NEW = 1
+
+# 粗估时给输出预留的 token 数（usage 回来后再校正）
+OUTPUT_TOKENS_GUESS = 256
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_S = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+class RateLimitTimeout(TimeoutError):
+    """在调用方给的 timeout（通常是 run 的剩余时间）内没排到。"""
+
+def parse_duration(value: str) -> Optional[float]:
+    """x-ratelimit-reset-* 的格式：'1s' / '6m0s' / '20ms' / '1h2m3.5s'。"""
+    parts = _DURATION.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_S[u] for n, u in parts)
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    ra = headers.get("retry-after")
+    if ra:
+        try:
+            return float(ra)
+        except ValueError:
+            return parse_duration(ra)
+    return None
+
+def estimate_tokens(
+    input_items: Any,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    output_tokens: int = OUTPUT_TOKENS_GUESS,
+) -> int:
+    # 和 tool_index.schema_tokens 一样按 字符数 / 4 粗估，再加上输出部分（默认按预留值）
+    chars = len(json.dumps(input_items, ensure_ascii=False, default=str))
+    if tools:
+        chars += len(json.dumps(tools, ensure_ascii=False))
+    return chars // 4 + output_tokens
+
+class _Bucket:
+    """每分钟 capacity 个令牌，匀速回填；level 可以被校正成负数（实际用量超过估计）。"""
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        # 单次请求超过整桶容量时按满桶放行，否则永远排不到
+        need = min(amount, self.capacity) - self.level
+        return 0.0 if need <= 0 else need * 60.0 / self.capacity
+
+class RateLimiter:
+    def __init__(self, rpm: int = 500, tpm: int = 200_000) -> None:
+        self._cond = threading.Condition()
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self._queue: List[Tuple[int, int]] = []   # (priority, seq) 小顶堆，只有堆顶可以拿令牌
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self.waits: Deque[float] = deque(maxlen=1000)
+        self.waiting = {PRIORITY_IN_FLIGHT: 0, PRIORITY_NEW: 0}
+        self.counters: Dict[str, int] = {"acquired": 0, "throttled_429": 0, "timeouts": 0, "header_updates": 0}
+
+    # --------- acquire / settle ----------
+    def acquire(self, est_tokens: int, priority: int = PRIORITY_NEW, timeout: Optional[float] = None) -> float:
+        """
+        排队拿 1 个请求令牌 + est_tokens 个 token 令牌，返回排队秒数。
+        timeout 内没排到抛 RateLimitTimeout。
+        """
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay: Optional[float] = None
+                    if self._queue[0] == ticket:
+                        delay = self._delay(now, est_tokens)
+                        if delay <= 0:
+                            heapq.heappop(self._queue)
+                            self.requests.level -= 1
+                            self.tokens.level -= est_tokens
+                            break
+                    if timeout is not None:
+                        left = timeout - (now - start)
+                        if left <= 0:
+                            self._queue.remove(ticket)
+                            heapq.heapify(self._queue)
+                            self.counters["timeouts"] += 1
+                            raise RateLimitTimeout(f"rate limiter wait exceeded {timeout:.2f}s")
+                        delay = left if delay is None else min(delay, left)
+                    # 不在堆顶的等前面的人放行后 notify；堆顶的按需要的回填时间睡
+                    self._cond.wait(delay)
+            finally:
+                self.waiting[priority] -= 1
+                # 堆顶换人了（拿到令牌 / 超时退出），叫醒后面的
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self.waits.append(waited)
+            self.counters["acquired"] += 1
+        return waited
+
+    def settle(self, est_tokens: int, actual_tokens: Optional[int]) -> None:
+        """请求结束后按真实 usage 校正 token 桶；actual_tokens=None 表示不知道，按估计值算。"""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.tokens.level += est_tokens - actual_tokens
+            self._cond.notify_all()
+
+    # --------- 服务端反馈 ----------
+    def observe_headers(self, headers: Mapping[str, str]) -> None:
+        updated = False
+        with self._cond:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = _to_float(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = _to_float(headers.get(f"x-ratelimit-remaining-{kind}"))
+                bucket.refill(now)
+                if limit and limit != bucket.capacity:
+                    bucket.capacity = limit
+                    bucket.level = min(bucket.level, limit)
+                    updated = True
+                if remaining is not None and remaining < bucket.level:
+                    bucket.level = remaining
+                    updated = True
+            if updated:
+                self.counters["header_updates"] += 1
+            self._cond.notify_all()
+
+    def on_429(self, headers: Mapping[str, str]) -> float:
+        """暂停到 retry-after 之后；没给 retry-after 时按 1s。返回暂停秒数。"""
+        pause = retry_after_seconds(headers)
+        if pause is None:
+            pause = 1.0
+        self.observe_headers(headers)
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.counters["throttled_429"] += 1
+            self._cond.notify_all()
+        return pause
+
+    # --------- stats ----------
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            xs = sorted(self.waits)
+
+            def pct(p: float) -> Optional[float]:
+                return round(xs[min(len(xs) - 1, int(p * len(xs)))], 4) if xs else None
+
+            return {
+                **self.counters,
+                "rpm_limit": self.requests.capacity,
+                "tpm_limit": self.tokens.capacity,
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level),
+                "waiting_in_flight": self.waiting[PRIORITY_IN_FLIGHT],
+                "waiting_new": self.waiting[PRIORITY_NEW],
+                "paused_s": round(max(0.0, self._paused_until - now), 3),
+                "wait_p50_s": pct(0.50),
+                "wait_p95_s": pct(0.95),
+                "wait_max_s": round(xs[-1], 4) if xs else None,
+            }
+
+    # --------- internals ----------
+    def _delay(self, now: float, est_tokens: int) -> float:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self._paused_until - now, self.requests.wait_for(1), self.tokens.wait_for(est_tokens), 0.0)
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+_limiter = RateLimiter(
+    rpm=int(os.environ.get("OPENAI_RPM_LIMIT", "500")),
+    tpm=int(os.environ.get("OPENAI_TPM_LIMIT", "200000")),
+)
+
+def get_rate_limiter() -> RateLimiter:
+    return _limiter
+
+def set_rate_limiter(limiter: RateLimiter) -> None:
+    global _limiter
+    _limiter = limiter
@@ -0,0 +1,37 @@
+"""
+Responses API 返回值的读取工具：SDK 对象和 dict（mock / 流式事件里的 response）都能读。
+budget.py（记账）和 llm.py（限流器按 usage 校正）共用。
+"""
+
+from typing import Any
+
+def get_field(item: Any, key: str, default: Any = None) -> Any:
+    if isinstance(item, dict):
+        return item.get(key, default)
+    return getattr(item, key, default)
+
+def has_usage(resp: Any) -> bool:
+    return resp is not None and get_field(resp, "usage") is not None
+
+def usage_tokens(resp: Any) -> int:
+    """usage.total_tokens；没有 total 时用 input + output；没有 usage 返回 0。"""
+    usage = get_field(resp, "usage")
+    if usage is None:
+        return 0
+    total = get_field(usage, "total_tokens")
+    if isinstance(total, int):
+        return total
+    return int(get_field(usage, "input_tokens", 0) or 0) + int(get_field(usage, "output_tokens", 0) or 0)
+
+def output_text(resp: Any) -> str:
+    chunks = []
+    for item in get_field(resp, "output", []) or []:
+        if get_field(item, "type") in ("message", "output_text"):
+            content = get_field(item, "content")
+            if isinstance(content, str):
+                chunks.append(content)
+            elif isinstance(content, list):
+                for c in content:
+                    if get_field(c, "type") in ("output_text", "text"):
+                        chunks.append(get_field(c, "text", ""))
+    return "\n".join([c for c in chunks if c.strip()]).strip()
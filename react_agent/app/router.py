@@ -1,7 +1,9 @@
 import json
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from .budget import RunBudget
+from .jsonstream import IncrementalJSONParser, json_schema_format
 from .llm import LLM
 from .trace import Tracer
 from .prompts import ROUTER_SYSTEM
@@ -14,44 +16,60 @@ class RouteDecision:
     tools: List[str]         # recommended tools
     reason: str
 
+# key 顺序即输出顺序：route 最先出来，FSM 可以尽早切状态
+ROUTER_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "route": {"type": "string", "enum": ["direct", "react"]},
+        "tools": {"type": "array", "items": {"type": "string", "enum": AVAILABLE_TOOL_NAMES}},
+        "reason": {"type": "string"},
+    },
+    "required": ["route", "tools", "reason"],
+    "additionalProperties": False,
+}
+
 def _safe_parse_json(text: str) -> Dict[str, Any]:
     try:
         return json.loads(text)
     except Exception:
         return {}
 
-def _item_get(item: Any, key: str, default: Any = None) -> Any:
-    if isinstance(item, dict):
-        return item.get(key, default)
-    return getattr(item, key, default)
-
-def route(llm: LLM, tracer: Tracer, user_query: str) -> RouteDecision:
-    # Router 不需要 tools，只要产出结构化 JSON 决策
-    resp = llm.respond(
+def route(llm: LLM, tracer: Tracer, user_query: str, budget: Optional[RunBudget] = None) -> RouteDecision:
+    # Router 不需要 tools，只要产出结构化 JSON 决策（structured output + 流式解析）
+    budget = budget or RunBudget(tracer=tracer)
+    parser = IncrementalJSONParser()
+    data: Dict[str, Any] = {}
+    deltas = budget.stream(
+        llm,
+        "ROUTE",
         input_items=[
             {"role": "system", "content": ROUTER_SYSTEM},
             {"role": "user", "content": user_query},
         ],
         tools=None,
         tool_choice="none",
+        text=json_schema_format("route_decision", ROUTER_SCHEMA),
     )
+    try:
+        for delta in deltas:
+            for path, value in parser.feed(delta):
+                if len(path) == 1:
+                    data[path[0]] = value
+                    if path[0] == "route":
+                        tracer.log("router.route_decoded", route=value)
+            if "route" in data and "tools" in data:
+                # reason 只是解释，拿到 route + tools 就可以切状态，不等剩下的 token
+                break
+    finally:
+        deltas.close()
+    raw = parser.text.strip()
 
-    # 从 resp.output 抽文本
-    text_chunks: List[str] = []
-    for item in getattr(resp, "output", []) or []:
-        if _item_get(item, "type") in ("message", "output_text"):
-            content = _item_get(item, "content")
-            if isinstance(content, str):
-                text_chunks.append(content)
-            elif isinstance(content, list):
-                for c in content:
-                    if _item_get(c, "type") in ("output_text", "text"):
-                        text_chunks.append(_item_get(c, "text", ""))
-    raw = "\n".join([t for t in text_chunks if t.strip()]).strip()
-
-    tracer.log("router.raw", raw=raw[:400])
+    tracer.log("router.raw", raw=raw[:400], early_exit=not parser.done)
 
-    data = _safe_parse_json(raw)
+    if "route" not in data:
+        data = _safe_parse_json(raw)
+        if "route" not in data:
+            tracer.log("router.parse_error", raw=raw[:400])
     route_val = data.get("route", "react")
     tools = data.get("tools", [])
     reason = data.get("reason", "")
@@ -0,0 +1,228 @@
+"""
+direct 路由的答案缓存。
+
+默认是规范化的词法缓存，不是语义缓存：key 是 query 的实词集合（content_tokens：小写、去功能词、
+去复数，中文按字去虚字），所以只认换了语序 / 功能词 / 大小写 / 标点的问法：
+  "How do I reverse a list in Python?" == "How can I reverse a Python list?"
+换了实词的同义改写（"Who wrote Hamlet?" / "Who is the author of Hamlet?"）不会命中。
+以前用的离线哈希 n-gram embedding 给这类改写的分数远低于阈值，却给 WWI / WWII 这种
+一字之差、答案不同的问题打 0.85 以上，没法靠阈值分开，所以不再默认使用。
+
+需要真正的语义匹配时传 embed_fn（真 embedding 模型）：key 没命中再按余弦相似度找，
+过阈值后还要求两边的数字 / 缩写专名（salient_tokens）一致，挡住 "12*34" / "12*35"、"TCP" / "QUIC"。
+给 path 时元数据放 path/meta.json；有 embed_fn 时向量矩阵放 path/vectors.f32（np.memmap）。
+TTL / LRU 容量都可配。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+# 全大写缩写（TCP、WWII）和带数字的词：embedding 里很不起眼，却决定答案
+_SALIENT = re.compile(r"\b(?:[A-Z]{2,}[A-Za-z]*|\w*\d\w*)\b")
+
+# 不影响答案的功能词；其余的词（含数字、专名）两边必须一致才算同一个问题
+_STOPWORDS = frozenset(
+    "a an the of in on at to for from by with about into and or is are was were be been being am "
+    "do does did can could would should will shall may might must "
+    "what whats which who whom whose when where why how "
+    "i me my you your we our us it its this that these those there "
+    "s t please tell explain give show let know "
+    "many much some any".split()
+)
+_CJK_FUNCTION_CHARS = frozenset("的了吗呢吧啊呀么是在有和与及或请问下一个些什怎哪里儿这那我你们它把被给让")
+
+def content_tokens(text: str) -> FrozenSet[str]:
+    """
+    缓存 key 用的实词集合：小写、去功能词、简单去复数（years -> year）；
+    中文按字切，去掉常见虚字。
+    """
+    tokens = set()
+    for w in _WORD.findall(text.lower()):
+        if _CJK.search(w):
+            tokens.update(ch for ch in w if ch not in _CJK_FUNCTION_CHARS)
+            continue
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss") and not w.isdigit():
+            w = w[:-1]
+        tokens.add(w)
+    return frozenset(tokens)
+
+def salient_tokens(text: str) -> FrozenSet[str]:
+    """数字和缩写专名；embed_fn 命中后用它做校验。"""
+    return frozenset(m.lower() for m in _SALIENT.findall(text))
+
+def cache_key(text: str) -> str:
+    # 全是功能词的 query（"What is it?"）没有实词，退回整句，避免它们互相命中
+    return " ".join(sorted(content_tokens(text))) or " ".join(_WORD.findall(text.lower()))
+
+class SemanticCache:
+    def __init__(
+        self,
+        capacity: int = 1024,
+        threshold: float = 0.85,
+        ttl_s: float = 24 * 3600,
+        dim: int = 512,
+        path: Optional[str] = None,
+        embed_fn: Optional[Callable[[str], np.ndarray]] = None,
+    ) -> None:
+        """
+        path：目录，给了就持久化（见模块说明）。
+        embed_fn / threshold / dim：可选的 embedding 匹配，embed_fn 返回 dim 维 L2 归一化向量；不给时只按 key 精确匹配。
+        """
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.dim = dim
+        self.path = path
+        self.embed_fn = embed_fn
+        self._lock = threading.Lock()
+
+        # 每个槽位的元数据：key / query / answer / 写入时间 / 最近使用时间；None 表示空槽
+        self.slots: List[Optional[dict]] = [None] * capacity
+        self.vectors: Optional[np.ndarray] = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            if embed_fn is not None:
+                vec_path = os.path.join(path, "vectors.f32")
+                mode = "r+" if os.path.exists(vec_path) else "w+"
+                self.vectors = np.memmap(vec_path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+            self._load_meta()
+        elif embed_fn is not None:
+            self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._by_key: Dict[str, int] = {s["key"]: i for i, s in enumerate(self.slots) if s is not None}
+
+        self.hits = 0
+        self.misses = 0
+        self.guard_rejects = 0   # embedding 分数过了阈值、被 salient_tokens 校验拦下的次数
+        self.saved_s = 0.0
+        self._miss_latency_sum = 0.0
+        self._miss_latency_n = 0
+
+    # --------- lookup / put ----------
+    def lookup(self, query: str) -> Optional[Tuple[str, float]]:
+        """命中返回 (answer, score)；key 命中的 score 是 1.0。"""
+        key = cache_key(query)
+        now = time.time()
+        with self._lock:
+            idx = self._by_key.get(key)
+            if idx is not None and self._live(self.slots[idx], now):
+                return self._hit(idx, now, 1.0)
+            if self.vectors is None:
+                self.misses += 1
+                return None
+        # embed_fn 可能是一次模型调用，不在锁里做
+        vec = self.embed_fn(query)
+        with self._lock:
+            idx, score = self._best_embedded(query, vec, now)
+            if idx is None:
+                self.misses += 1
+                return None
+            return self._hit(idx, now, score)
+
+    def put(self, query: str, answer: str, latency_s: Optional[float] = None) -> None:
+        key = cache_key(query)
+        vec = self.embed_fn(query) if self.embed_fn is not None else None
+        now = time.time()
+        with self._lock:
+            if latency_s is not None:
+                self._miss_latency_sum += latency_s
+                self._miss_latency_n += 1
+            idx = self._by_key.get(key)
+            if idx is None:
+                idx = self._free_slot(now)
+                old = self.slots[idx]
+                if old is not None:
+                    self._by_key.pop(old["key"], None)
+            if vec is not None:
+                self.vectors[idx] = vec
+            self.slots[idx] = {"key": key, "query": query, "answer": answer, "ts": now, "used": now}
+            self._by_key[key] = idx
+            if self.path:
+                if self.vectors is not None:
+                    self.vectors.flush()
+                self._save_meta()
+
+    # --------- stats ----------
+    def avg_miss_latency(self) -> float:
+        return self._miss_latency_sum / self._miss_latency_n if self._miss_latency_n else 0.0
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "guard_rejects": self.guard_rejects,
+            "hit_rate": round(self.hit_rate(), 4),
+            "saved_s": round(self.saved_s, 3),
+            "entries": sum(1 for s in self.slots if s is not None),
+        }
+
+    # --------- internals ----------
+    def _live(self, slot: Optional[dict], now: float) -> bool:
+        return slot is not None and now - slot["ts"] <= self.ttl_s
+
+    def _hit(self, idx: int, now: float, score: float) -> Tuple[str, float]:
+        slot = self.slots[idx]
+        slot["used"] = now
+        self.hits += 1
+        self.saved_s += self.avg_miss_latency()
+        return slot["answer"], score
+
+    def _best_embedded(self, query: str, vec: np.ndarray, now: float) -> Tuple[Optional[int], float]:
+        """过阈值的候选按分数从高到低做 salient_tokens 校验，返回第一个通过的。"""
+        live = np.array([self._live(s, now) for s in self.slots], dtype=bool)
+        if not live.any():
+            return None, 0.0
+        idxs = np.flatnonzero(live)
+        sims = self.vectors[idxs] @ vec
+        want = salient_tokens(query)
+        for k in np.argsort(-sims):
+            if sims[k] < self.threshold:
+                break
+            if salient_tokens(self.slots[int(idxs[k])]["query"]) == want:
+                return int(idxs[k]), float(sims[k])
+            self.guard_rejects += 1
+        return None, 0.0
+
+    def _free_slot(self, now: float) -> int:
+        # 空槽 > 过期槽 > 最久未使用（LRU）
+        for i, s in enumerate(self.slots):
+            if not self._live(s, now):
+                return i
+        return min(range(self.capacity), key=lambda i: self.slots[i]["used"])
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _load_meta(self) -> None:
+        try:
+            with open(self._meta_path(), encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if saved.get("dim") != self.dim or len(saved.get("slots", [])) != self.capacity:
+            # 维度/容量变了，旧向量不可用
+            return
+        self.slots = saved["slots"]
+        for s in self.slots:
+            if s is not None:
+                # 旧格式没有 key；规则变了也以当前的 cache_key 为准
+                s["key"] = cache_key(s["query"])
+
+    def _save_meta(self) -> None:
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "slots": self.slots}, f, ensure_ascii=False)
+        os.replace(tmp, self._meta_path())
@@ -0,0 +1,410 @@
+"""
+最小 asyncio HTTP 前端（只用标准库）：
+- POST /v1/run     JSON 请求/响应
+- POST /v1/stream  SSE：实时推 trace 事件，最后推 answer
+- GET  /healthz    存活探针
+- GET  /metrics    in_flight / queued / 拒绝数 / 延迟分位 / 限流排队时间等
+Agent 本身是同步代码，跑在线程池里；并发数和排队长度都有上限，超了直接 429。
+
+  python -m react_agent.app.server --port 8080 --stub-latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .agent import ReactAgent
+from .agent_fsm import AgentFSM, AgentConfig
+from .llm import LLM
+from .memory import Memory
+from .ratelimit import RateLimiter, get_rate_limiter, set_rate_limiter
+from .trace import Tracer
+
+MAX_BODY_BYTES = 1 << 20
+
+class RunCancelled(Exception):
+    """客户端断开后，在下一次 trace 时中断正在跑的 agent。"""
+
+class _ServerTracer(Tracer):
+    """
+    Tracer 的服务端版本：
+    - cancel_event 被置位后，下一次 log 抛 RunCancelled（同步 agent 只能协作式取消）
+    - on_event 回调把事件推给 SSE 连接
+    """
+    def __init__(self, cancel_event: threading.Event, on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+        super().__init__()
+        self.cancel_event = cancel_event
+        self.on_event = on_event
+
+    def log(self, kind: str, **data: Any) -> None:
+        if self.cancel_event.is_set():
+            raise RunCancelled(kind)
+        super().log(kind, **data)
+        if self.on_event is not None:
+            # sub-executor 会并发 log，不能取 events[-1]
+            self.on_event({"ts": time.time(), "kind": kind, "data": data})
+
+def _validate_limits(body: Dict[str, Any]) -> Optional[str]:
+    """deadline_s / token_budget 可选；给了必须是正数（token_budget 是整数）。"""
+    deadline = body.get("deadline_s")
+    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0):
+        return "'deadline_s' must be a positive number"
+    budget = body.get("token_budget")
+    if budget is not None and (isinstance(budget, bool) or not isinstance(budget, int) or budget <= 0):
+        return "'token_budget' must be a positive integer"
+    return None
+
+class StubLLM:
+    """
+    本地压测用的假 LLM：固定延迟后直接回一段文本，不调用任何工具。
+    """
+    def __init__(self, latency_s: float = 0.1, text: str = "stub answer") -> None:
+        self.latency_s = latency_s
+        self.text = text
+        self.model = "stub"
+
+    def respond(self, input_items: List[Dict[str, Any]], tools=None, tool_choice: str = "auto", timeout=None, text=None, priority=None):
+        time.sleep(self.latency_s)
+        return SimpleNamespace(
+            output=[{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": self.text}]}],
+            usage=SimpleNamespace(input_tokens=0, output_tokens=0, total_tokens=0),
+        )
+
+@dataclass
+class ServerConfig:
+    host: str = "127.0.0.1"
+    port: int = 8080
+    max_concurrency: int = 8      # 同时在跑的 run 数
+    max_queue: int = 32           # 等待执行的 run 数，超过返回 429
+    sse_queue_size: int = 256     # 单个 SSE 连接缓存的 trace 事件数，慢客户端会丢 trace（不丢 answer）
+    model: str = "gpt-4.1-mini"
+    answer_cache_path: Optional[str] = None   # 给目录时所有 FSM run 共享一个 direct 路由答案缓存
+
+class AgentServer:
+    def __init__(self, config: ServerConfig = ServerConfig(), llm_factory: Optional[Callable[[], Any]] = None) -> None:
+        self.config = config
+        self.llm_factory = llm_factory or (lambda: LLM(model=config.model))
+        self.pool = ThreadPoolExecutor(max_workers=config.max_concurrency, thread_name_prefix="agent-run")
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.counters: Dict[str, int] = {"requests": 0, "completed": 0, "rejected": 0, "cancelled": 0, "errors": 0}
+        self.latencies: Deque[float] = deque(maxlen=1000)
+        self.queue_waits: Deque[float] = deque(maxlen=1000)
+        self.answer_cache = None
+        if config.answer_cache_path:
+            from .semantic_cache import SemanticCache
+            self.answer_cache = SemanticCache(path=config.answer_cache_path)
+
+    # --------- agent ----------
+    def _run_agent(self, body: Dict[str, Any], tracer: Tracer) -> str:
+        query = str(body.get("query", ""))
+        kind = body.get("agent", "fsm")
+        llm = self.llm_factory()
+        if kind == "react":
+            return ReactAgent(llm=llm, memory=Memory(), tracer=tracer).run(query)
+        agent = AgentFSM(
+            llm=llm,
+            tracer=tracer,
+            config=AgentConfig(enable_planner=bool(body.get("planner", True))),
+            answer_cache=self.answer_cache,
+        )
+        return agent.run(query, deadline_s=body.get("deadline_s"), token_budget=body.get("token_budget"))
+
+    async def _admit_and_run(self, body: Dict[str, Any], tracer: _ServerTracer, unreserve: Callable[[], None]) -> str:
+        """
+        有界准入：排队中的 run 在拿到执行槽前被取消就直接退出，不占线程。
+        调用方检查容量时已经占好了一个 queued 名额，这里拿到执行槽（或被取消）时用 unreserve 还掉。
+        """
+        assert self.slots is not None
+        loop = asyncio.get_running_loop()
+        enq = time.monotonic()
+        try:
+            await self.slots.acquire()
+        finally:
+            unreserve()
+        self.queue_waits.append(time.monotonic() - enq)
+        self.in_flight += 1
+        start = time.monotonic()
+
+        def release() -> None:
+            self.in_flight -= 1
+            self.slots.release()
+            self.latencies.append(time.monotonic() - start)
+
+        def on_done(_: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(release)
+            except RuntimeError:
+                # 事件循环已经关了（进程退出中）
+                pass
+
+        # 槽位跟着线程走：客户端断开时这里的 await 被取消，但线程要到下一次 tracer.log 才停，
+        # 在那之前槽位 / in_flight 都不能还
+        fut = self.pool.submit(self._run_agent, body, tracer)
+        fut.add_done_callback(on_done)
+        return await asyncio.wrap_future(fut)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight + self.queued < self.config.max_concurrency + self.config.max_queue
+
+    # --------- http ----------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            req = await self._read_request(reader)
+            if req is None:
+                await self._send_json(writer, 400, {"error": "bad request"})
+                return
+            method, path, body = req
+            if method == "GET" and path == "/healthz":
+                await self._send_json(writer, 200, {"ok": True})
+            elif method == "GET" and path == "/metrics":
+                await self._send_json(writer, 200, self.metrics())
+            elif method == "POST" and path in ("/v1/run", "/v1/stream"):
+                await self._handle_run(reader, writer, body, stream=(path == "/v1/stream"))
+            else:
+                await self._send_json(writer, 404, {"error": "not found"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _handle_run(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, raw: bytes, stream: bool) -> None:
+        self.counters["requests"] += 1
+        try:
+            body = json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            body = None
+        if not isinstance(body, dict) or not isinstance(body.get("query"), str):
+            await self._send_json(writer, 400, {"error": "body must be JSON with a string 'query'"})
+            return
+        error = _validate_limits(body)
+        if error:
+            await self._send_json(writer, 400, {"error": error})
+            return
+        if not self._has_capacity():
+            self.counters["rejected"] += 1
+            await self._send_json(writer, 429, {"error": "server overloaded"}, extra_headers={"Retry-After": "1"})
+            return
+
+        cancel = threading.Event()
+        events: Optional[asyncio.Queue] = None
+        dropped = [0]
+        if stream:
+            loop = asyncio.get_running_loop()
+            events = asyncio.Queue(maxsize=self.config.sse_queue_size)
+
+            def push(ev: Dict[str, Any]) -> None:
+                def _put() -> None:
+                    try:
+                        events.put_nowait(ev)
+                    except asyncio.QueueFull:
+                        dropped[0] += 1
+                loop.call_soon_threadsafe(_put)
+
+            tracer = _ServerTracer(cancel, on_event=push)
+        else:
+            tracer = _ServerTracer(cancel)
+
+        # 检查和占名额之间不能有 await：同一个 tick 里到达的请求要看到彼此占的名额，否则突发流量全部放行
+        self.queued += 1
+        reserved = [True]
+
+        def unreserve() -> None:
+            # 幂等：task 在开始执行前就被取消时，_admit_and_run 的 finally 不会跑，由下面的 finally 还
+            if reserved[0]:
+                reserved[0] = False
+                self.queued -= 1
+
+        run_task = asyncio.ensure_future(self._admit_and_run(body, tracer, unreserve))
+        # 请求体已经读完，之后读到 EOF 说明客户端断开
+        disconnect_task = asyncio.ensure_future(reader.read(1))
+
+        try:
+            if stream:
+                await self._stream_run(writer, run_task, disconnect_task, events, dropped)
+            else:
+                await self._json_run(writer, run_task, disconnect_task)
+        finally:
+            if not run_task.done():
+                cancel.set()
+                run_task.cancel()
+                self.counters["cancelled"] += 1
+            unreserve()
+            disconnect_task.cancel()
+
+    async def _json_run(self, writer: asyncio.StreamWriter, run_task: asyncio.Future, disconnect_task: asyncio.Future) -> None:
+        await asyncio.wait([run_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+        if not run_task.done():
+            return
+        try:
+            answer = run_task.result()
+        except RunCancelled:
+            return
+        except Exception as e:
+            self.counters["errors"] += 1
+            await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self.counters["completed"] += 1
+        await self._send_json(writer, 200, {"answer": answer})
+
+    async def _stream_run(
+        self,
+        writer: asyncio.StreamWriter,
+        run_task: asyncio.Future,
+        disconnect_task: asyncio.Future,
+        events: asyncio.Queue,
+        dropped: List[int],
+    ) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+
+        while True:
+            get_task = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait([get_task, run_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+            if get_task in done:
+                # drain() 让慢客户端自然反压到队列，队列满了丢 trace
+                await self._send_sse(writer, "trace", get_task.result())
+                continue
+            get_task.cancel()
+            if disconnect_task in done and not run_task.done():
+                return
+            break
+
+        while not events.empty():
+            await self._send_sse(writer, "trace", events.get_nowait())
+        try:
+            answer = run_task.result()
+        except RunCancelled:
+            return
+        except Exception as e:
+            self.counters["errors"] += 1
+            await self._send_sse(writer, "error", {"error": f"{type(e).__name__}: {e}"})
+            return
+        self.counters["completed"] += 1
+        await self._send_sse(writer, "answer", {"answer": answer, "dropped_trace_events": dropped[0]})
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+        request_line = await reader.readline()
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2:
+            return None
+        method, path = parts[0].upper(), parts[1].split("?", 1)[0]
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return None
+        if length < 0 or length > MAX_BODY_BYTES:
+            return None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, body
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], extra_headers: Optional[Dict[str, str]] = None) -> None:
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {reasons.get(status, 'OK')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(data)}",
+            "Connection: close",
+        ]
+        for k, v in (extra_headers or {}).items():
+            head.append(f"{k}: {v}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+
+    async def _send_sse(self, writer: asyncio.StreamWriter, event: str, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False, default=str)
+        writer.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+        await writer.drain()
+
+    # --------- metrics ----------
+    def metrics(self) -> Dict[str, Any]:
+        def pct(values: Deque[float], p: float) -> Optional[float]:
+            if not values:
+                return None
+            xs = sorted(values)
+            return round(xs[min(len(xs) - 1, int(p * len(xs)))], 4)
+
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.config.max_concurrency,
+            "max_queue": self.config.max_queue,
+            "latency_p50_s": pct(self.latencies, 0.50),
+            "latency_p95_s": pct(self.latencies, 0.95),
+            "queue_wait_p95_s": pct(self.queue_waits, 0.95),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "rate_limiter": get_rate_limiter().stats(),
+        }
+
+    # --------- lifecycle ----------
+    async def serve(self) -> None:
+        self.slots = asyncio.Semaphore(self.config.max_concurrency)
+        server = await asyncio.start_server(self.handle, self.config.host, self.config.port)
+        print(f"serving on http://{self.config.host}:{self.config.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve ReactAgent / AgentFSM over HTTP (JSON + SSE).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--model", default="gpt-4.1-mini")
+    parser.add_argument("--answer-cache", default=None, help="directory for the shared direct-answer cache")
+    parser.add_argument("--rpm", type=int, default=None, help="initial requests/minute for the client-side rate limiter")
+    parser.add_argument("--tpm", type=int, default=None, help="initial tokens/minute for the client-side rate limiter")
+    parser.add_argument("--stub-latency", type=float, default=None, help="use StubLLM with this latency (seconds) instead of the API")
+    args = parser.parse_args()
+
+    config = ServerConfig(
+        host=args.host,
+        port=args.port,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        model=args.model,
+        answer_cache_path=args.answer_cache,
+    )
+    if args.rpm is not None or args.tpm is not None:
+        current = get_rate_limiter()
+        set_rate_limiter(RateLimiter(
+            rpm=args.rpm if args.rpm is not None else int(current.requests.capacity),
+            tpm=args.tpm if args.tpm is not None else int(current.tokens.capacity),
+        ))
+    llm_factory = (lambda: StubLLM(latency_s=args.stub_latency)) if args.stub_latency is not None else None
+    try:
+        asyncio.run(AgentServer(config, llm_factory=llm_factory).serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+把 Tracer 事件转成可视化时间线：
+- Chrome Trace Event（chrome://tracing / Perfetto）
+- speedscope（evented profile，每个线程一条）
+span 事件（run -> state -> llm / tool）按时间自然嵌套；普通 log 事件作为 instant 事件。
+另外给出关键路径和空闲间隙分析，方便定位慢 run 的时间去哪了。
+
+  python -m react_agent.app.timeline trace.json --format chrome -o run.trace.json
+  python -m react_agent.app.timeline trace.json --analyze
+"""
+
+import argparse
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .trace import TraceEvent
+
+# 叶子 span：真正“干活”的区间，关键路径 / 空闲分析只看它们
+LEAF_KINDS = ("span.llm", "span.tool")
+
+def _as_event(e: Union[TraceEvent, Dict[str, Any]]) -> TraceEvent:
+    if isinstance(e, TraceEvent):
+        return e
+    return TraceEvent(ts=e["ts"], kind=e["kind"], data=e.get("data") or {}, dur=e.get("dur"), tid=e.get("tid", 0))
+
+def span_name(e: TraceEvent) -> str:
+    d = e.data
+    if e.kind == "span.run":
+        return f"run {d.get('agent', '')}".strip()
+    if e.kind == "span.state":
+        return str(d.get("state", "state"))
+    if e.kind == "span.llm":
+        return f"llm {d.get('state', '')}".strip()
+    if e.kind == "span.tool":
+        return f"tool {d.get('name', '')}".strip()
+    if e.kind == "span.substep":
+        return f"substep {d.get('step_id', '')}".strip()
+    return e.kind
+
+def _tid_map(events: List[TraceEvent]) -> Dict[int, int]:
+    tids: Dict[int, int] = {}
+    for e in sorted(events, key=lambda x: x.ts):
+        tids.setdefault(e.tid, len(tids) + 1)
+    return tids
+
+def _chrome_event(e: TraceEvent, t0: float, tid: int) -> Dict[str, Any]:
+    ev: Dict[str, Any] = {
+        "name": span_name(e),
+        "cat": e.kind.split(".")[0],
+        "pid": 1,
+        "tid": tid,
+        "ts": round((e.ts - t0) * 1e6, 1),
+        "args": json.loads(json.dumps(e.data, ensure_ascii=False, default=str)),
+    }
+    if e.dur is not None:
+        ev["ph"] = "X"
+        ev["dur"] = round(e.dur * 1e6, 1)
+    else:
+        ev["ph"] = "i"
+        ev["s"] = "t"
+    return ev
+
+def to_chrome_trace(events: List[Union[TraceEvent, Dict[str, Any]]]) -> Dict[str, Any]:
+    evs = [_as_event(e) for e in events]
+    if not evs:
+        return {"traceEvents": []}
+    t0 = min(e.ts for e in evs)
+    tids = _tid_map(evs)
+    out = [_chrome_event(e, t0, tids[e.tid]) for e in sorted(evs, key=lambda x: (x.ts, -(x.dur or 0)))]
+    for raw, tid in tids.items():
+        out.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": f"thread-{tid}"}})
+    return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+def to_speedscope(events: List[Union[TraceEvent, Dict[str, Any]]], name: str = "agent run") -> Dict[str, Any]:
+    evs = [_as_event(e) for e in events if _as_event(e).dur is not None]
+    frames: List[Dict[str, str]] = []
+    frame_idx: Dict[str, int] = {}
+    profiles: List[Dict[str, Any]] = []
+    if not evs:
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json", "shared": {"frames": []}, "profiles": []}
+    t0 = min(e.ts for e in evs)
+    tids = _tid_map(evs)
+
+    for raw_tid, tid in tids.items():
+        spans = sorted([e for e in evs if e.tid == raw_tid], key=lambda x: (x.ts, -(x.dur or 0)))
+        opened: List[Tuple[float, int]] = []   # (end, frame)
+        out: List[Dict[str, Any]] = []
+
+        def close_until(t: float) -> None:
+            while opened and opened[-1][0] <= t + 1e-9:
+                end, fr = opened.pop()
+                out.append({"type": "C", "frame": fr, "at": round((end - t0) * 1000, 3)})
+
+        for s in spans:
+            close_until(s.ts)
+            label = span_name(s)
+            if label not in frame_idx:
+                frame_idx[label] = len(frames)
+                frames.append({"name": label})
+            fr = frame_idx[label]
+            # 父 span 先结束（时钟抖动）时截断到父区间内，保证 O/C 严格嵌套
+            end = s.ts + s.dur
+            if opened:
+                end = min(end, opened[-1][0])
+            out.append({"type": "O", "frame": fr, "at": round((s.ts - t0) * 1000, 3)})
+            opened.append((end, fr))
+        close_until(float("inf"))
+
+        profiles.append({
+            "type": "evented",
+            "name": f"{name} / thread-{tid}",
+            "unit": "milliseconds",
+            "startValue": out[0]["at"] if out else 0,
+            "endValue": out[-1]["at"] if out else 0,
+            "events": out,
+        })
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+        "name": name,
+    }
+
+def analyze(events: List[Union[TraceEvent, Dict[str, Any]]], top_gaps: int = 5) -> Dict[str, Any]:
+    """
+    - busy：llm / tool 叶子区间在各线程上的并集时间
+    - idle_gaps：run 内没有任何 llm / tool 在跑的区间（框架开销、排队、解析等）
+    - critical_path：从 run 结束往回，每次取最晚结束的叶子区间，串起来就是决定总时长的那条链
+    """
+    evs = [_as_event(e) for e in events]
+    spans = [e for e in evs if e.dur is not None]
+    leaves = sorted([e for e in spans if e.kind in LEAF_KINDS], key=lambda x: x.ts)
+    runs = [e for e in spans if e.kind == "span.run"]
+    if runs:
+        start = min(r.ts for r in runs)
+        end = max(r.ts + r.dur for r in runs)
+    elif evs:
+        start = min(e.ts for e in evs)
+        end = max(e.ts + (e.dur or 0) for e in evs)
+    else:
+        return {"total_s": 0.0, "busy_s": 0.0, "idle_s": 0.0, "idle_gaps": [], "critical_path": []}
+
+    # 叶子区间并集 -> busy / idle
+    gaps: List[Dict[str, Any]] = []
+    busy = 0.0
+    cursor = start
+    prev: Optional[TraceEvent] = None
+    for s in leaves:
+        s_end = s.ts + s.dur
+        if s.ts > cursor:
+            gaps.append({
+                "start_ms": round((cursor - start) * 1000, 2),
+                "dur_ms": round((s.ts - cursor) * 1000, 2),
+                "after": span_name(prev) if prev else "run start",
+                "before": span_name(s),
+            })
+        if s_end > cursor:
+            busy += s_end - max(cursor, s.ts)
+            cursor = s_end
+            prev = s
+    if end > cursor:
+        gaps.append({
+            "start_ms": round((cursor - start) * 1000, 2),
+            "dur_ms": round((end - cursor) * 1000, 2),
+            "after": span_name(prev) if prev else "run start",
+            "before": "run end",
+        })
+
+    # 关键路径：倒着贪心找“最晚结束且不晚于当前时刻”的叶子区间
+    path: List[Dict[str, Any]] = []
+    t = end
+    remaining = list(leaves)
+    while remaining:
+        cands = [s for s in remaining if s.ts + s.dur <= t + 1e-6]
+        if not cands:
+            break
+        s = max(cands, key=lambda x: (x.ts + x.dur, x.dur))
+        path.append({"name": span_name(s), "start_ms": round((s.ts - start) * 1000, 2), "dur_ms": round(s.dur * 1000, 2)})
+        t = s.ts
+        remaining = [x for x in remaining if x.ts + x.dur <= t + 1e-6 and x is not s]
+    path.reverse()
+
+    by_kind: Dict[str, float] = {}
+    for s in leaves:
+        key = span_name(s)
+        by_kind[key] = by_kind.get(key, 0.0) + s.dur
+
+    total = end - start
+    return {
+        "total_s": round(total, 4),
+        "busy_s": round(busy, 4),
+        "idle_s": round(total - busy, 4),
+        "leaf_time_s": {k: round(v, 4) for k, v in sorted(by_kind.items(), key=lambda kv: -kv[1])},
+        "critical_path_s": round(sum(p["dur_ms"] for p in path) / 1000, 4),
+        "critical_path": path,
+        "idle_gaps": sorted(gaps, key=lambda g: -g["dur_ms"])[:top_gaps],
+    }
+
+class ChromeTraceWriter:
+    """
+    Tracer(live_export=...) 用：逐条追加 Chrome Trace 事件（JSON Array Format 允许不写结尾的 ]）。
+    span 在结束时才写入，所以文件内是按结束时间排序的，viewer 会自己排。
+    """
+    def __init__(self, path: str) -> None:
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write("[\n")
+        self.t0: Optional[float] = None
+        self.tids: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def write(self, e: TraceEvent) -> None:
+        with self._lock:
+            if self.t0 is None:
+                self.t0 = e.ts
+            if e.tid not in self.tids:
+                self.tids[e.tid] = len(self.tids) + 1
+            ev = _chrome_event(e, self.t0, self.tids[e.tid])
+            self.f.write(json.dumps(ev, ensure_ascii=False) + ",\n")
+            self.f.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            # 补一个 metadata 事件收尾，保证最后一个逗号后面还有合法元素
+            self.f.write(json.dumps({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "agent"}}) + "\n]\n")
+            self.f.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert Tracer.dump_json output to a flame-graph timeline.")
+    parser.add_argument("trace", help="JSON file produced by Tracer.dump_json()")
+    parser.add_argument("--format", choices=("chrome", "speedscope"), default="chrome")
+    parser.add_argument("-o", "--out", default=None)
+    parser.add_argument("--analyze", action="store_true", help="print critical path / idle gap analysis")
+    args = parser.parse_args()
+
+    with open(args.trace, encoding="utf-8") as f:
+        events = json.load(f)
+
+    if args.analyze:
+        print(json.dumps(analyze(events), ensure_ascii=False, indent=2))
+    if args.out or not args.analyze:
+        doc = to_chrome_trace(events) if args.format == "chrome" else to_speedscope(events)
+        text = json.dumps(doc, ensure_ascii=False)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            print(text)
+
+if __name__ == "__main__":
+    main()
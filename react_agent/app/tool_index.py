@@ -0,0 +1,84 @@
+import json
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+_WORD = re.compile(r"[a-z0-9]+|[一-鿿]+")
+
+# 几乎每个问题都带的功能词：留着会让任何一个带 "what is" 的工具描述都命中，把真正需要的工具挤掉
+_STOPWORDS = frozenset(
+    "a an the of in on at to for from by with and or is are was were be been am do does did "
+    "what which who how why when where this that these those it its i me my you your we our "
+    "can could would should will please tell show give let".split()
+)
+_CJK_STOPCHARS = frozenset("的了吗呢吧啊是在有和与请问一下个些什么怎哪这那我你它")
+
+def tokenize(text: str) -> List[str]:
+    """英文按词（snake_case 拆开），中文按单字 + 相邻双字；去掉功能词 / 虚字。"""
+    tokens: List[str] = []
+    for m in _WORD.findall(text.lower().replace("_", " ")):
+        if m[0] >= "一":
+            tokens.extend(ch for ch in m if ch not in _CJK_STOPCHARS)
+            tokens.extend(m[i:i + 2] for i in range(len(m) - 1) if not set(m[i:i + 2]) <= _CJK_STOPCHARS)
+        elif m not in _STOPWORDS:
+            tokens.append(m)
+    return tokens
+
+def schema_tokens(schemas: List[Dict[str, Any]]) -> int:
+    # 粗估：JSON 字符数 / 4，用来对比裁剪前后的 schema 开销
+    return len(json.dumps(schemas, ensure_ascii=False)) // 4
+
+class ToolIndex:
+    """
+    工具检索索引（BM25）：文档 = 工具名 + description + 参数名 + 额外关键词。
+    工具很多时按 query 只挑 top-k 个 schema 发给模型。
+    """
+    def __init__(
+        self,
+        schemas: List[Dict[str, Any]],
+        keywords: Optional[Dict[str, List[str]]] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+        min_score: float = 0.5,
+    ) -> None:
+        """min_score：最高分低于它（只命中了各工具都有的词）视为没检索到，由调用方退回全量。"""
+        self.schemas = {s["name"]: s for s in schemas}
+        self.min_score = min_score
+        self.full_tokens = schema_tokens(schemas)
+        self.k1 = k1
+        self.b = b
+        keywords = keywords or {}
+        self.docs: Dict[str, Counter] = {}
+        for s in schemas:
+            params = " ".join((s.get("parameters") or {}).get("properties", {}).keys())
+            text = " ".join([s["name"], s.get("description", ""), params, " ".join(keywords.get(s["name"], []))])
+            self.docs[s["name"]] = Counter(tokenize(text))
+        self.avg_len = sum(sum(c.values()) for c in self.docs.values()) / max(1, len(self.docs))
+        df: Counter = Counter()
+        for c in self.docs.values():
+            df.update(c.keys())
+        n = len(self.docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def search(self, query: str, k: int = 3) -> List[str]:
+        """返回得分 > 0 的 top-k 工具名；没命中或最高分太弱时返回 []，由调用方决定是否退回全量。"""
+        q = set(tokenize(query))
+        scores = []
+        for name, tf in self.docs.items():
+            dl = sum(tf.values())
+            score = 0.0
+            for t in q:
+                f = tf.get(t, 0)
+                if not f:
+                    continue
+                score += self.idf[t] * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * dl / self.avg_len))
+            if score > 0:
+                scores.append((score, name))
+        scores.sort(reverse=True)
+        if not scores or scores[0][0] < self.min_score:
+            return []
+        return [name for _, name in scores[:k]]
+
+    def select(self, names: List[str]) -> List[Dict[str, Any]]:
+        return [self.schemas[n] for n in names if n in self.schemas]
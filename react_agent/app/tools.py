@@ -2,6 +2,9 @@ import json
 import math
 from typing import Any, Callable, Dict, List
 
+from .blobstore import get_blob_store
+from .tool_index import ToolIndex
+
 # -------------------------
 # 1) 工具实现（Actions）
 # -------------------------
@@ -27,6 +30,22 @@ def lookup_doc(query: str) -> str:
     hits = [v for k, v in kb.items() if k in q]
     return json.dumps({"ok": True, "hits": hits or []}, ensure_ascii=False)
 
+READ_OBSERVATION_MAX = 4000
+
+def read_observation(handle: str, offset: int = 0, length: int = 2000) -> str:
+    # 分页读取被旁路存储的大 observation；单页不超过 READ_OBSERVATION_MAX 字节，避免再次被截断
+    length = max(0, min(int(length), READ_OBSERVATION_MAX))
+    offset = max(0, int(offset))
+    try:
+        text, start, end, total = get_blob_store().read(handle, offset, length)
+    except (ValueError, FileNotFoundError) as e:
+        return json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"}, ensure_ascii=False)
+    # offset / next_offset 是对齐到字符边界后的真实字节位置
+    return json.dumps(
+        {"ok": True, "handle": handle, "offset": start, "next_offset": end, "total_bytes": total, "eof": end >= total, "text": text},
+        ensure_ascii=False,
+    )
+
 # -------------------------
 # 2) 工具 schema（给模型看的）
 # -------------------------
@@ -54,6 +73,21 @@ TOOLS_SCHEMA: List[Dict[str, Any]] = [
             "additionalProperties": False,
         },
     },
+    {
+        "type": "function",
+        "name": "read_observation",
+        "description": "Read a byte range of a large tool result that was stored out of band (see its handle). Returns JSON with {ok,text,next_offset,eof}.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string"},
+                "offset": {"type": "integer"},
+                "length": {"type": "integer"},
+            },
+            "required": ["handle", "offset", "length"],
+            "additionalProperties": False,
+        },
+    },
 ]
 
 # -------------------------
@@ -65,4 +99,22 @@ ToolFn = Callable[..., str]
 TOOL_REGISTRY: Dict[str, ToolFn] = {
     "calculator": calculator,
     "lookup_doc": lookup_doc,
+    "read_observation": read_observation,
 }
+
+# -------------------------
+# 4) 检索索引（注册表加载时构建）：按 query 只挑相关的 schema
+# -------------------------
+
+# description 是英文，补充一些中文/同义关键词方便检索
+TOOL_KEYWORDS: Dict[str, List[str]] = {
+    "calculator": ["math", "compute", "calculate", "arithmetic", "计算", "算", "等于", "结果"],
+    # 不放 "what is" / "explain" 这类每个问题都可能带的词，只放知识库里有的主题
+    "lookup_doc": [
+        "docs", "knowledge", "react", "reasoning", "acting", "fsm", "state", "machine", "responses", "api",
+        "文档", "知识库", "状态机",
+    ],
+    "read_observation": ["handle", "truncated", "page", "blob"],
+}
+
+TOOL_INDEX = ToolIndex(TOOLS_SCHEMA, keywords=TOOL_KEYWORDS)
@@ -1,24 +1,64 @@
 import json
+import threading
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 @dataclass
 class TraceEvent:
     ts: float
     kind: str
     data: Dict[str, Any]
+    dur: Optional[float] = None   # 只有 span 事件有：持续秒数，此时 ts 是开始时间
+    tid: int = 0                  # 产生事件的线程，sub-executor 并发时用来分轨
 
 class Tracer:
-    def __init__(self) -> None:
+    def __init__(self, live_export: Optional[str] = None) -> None:
+        """
+        live_export：给一个文件路径时，事件实时写成 Chrome Trace（JSON Array Format），
+        进程中途挂掉也能直接拖进 chrome://tracing / Perfetto 看。
+        """
         self.events: List[TraceEvent] = []
+        self._lock = threading.Lock()
+        self._live = None
+        if live_export:
+            from .timeline import ChromeTraceWriter
+            self._live = ChromeTraceWriter(live_export)
 
     def log(self, kind: str, **data: Any) -> None:
-        self.events.append(TraceEvent(ts=time.time(), kind=kind, data=data))
+        self._record(TraceEvent(ts=time.time(), kind=kind, data=data, tid=threading.get_ident()))
+
+    @contextmanager
+    def span(self, kind: str, **data: Any) -> Iterator[Dict[str, Any]]:
+        """
+        记录一段有持续时间的区间（run / state / llm / tool），结束时落一条事件。
+        yield 出来的 dict 可以在区间内补字段（比如 tokens）。
+        """
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield data
+        finally:
+            self._record(TraceEvent(
+                ts=start, kind=kind, data=data, dur=time.perf_counter() - t0, tid=threading.get_ident(),
+            ))
+
+    def _record(self, event: TraceEvent) -> None:
+        with self._lock:
+            self.events.append(event)
+            if self._live is not None:
+                self._live.write(event)
+
+    def close(self) -> None:
+        if self._live is not None:
+            self._live.close()
+            self._live = None
 
     def dump_json(self) -> str:
-        return json.dumps([asdict(e) for e in self.events], ensure_ascii=False, indent=2)
+        return json.dumps([asdict(e) for e in self.events], ensure_ascii=False, indent=2, default=str)
 
     def print_tail(self, n: int = 10) -> None:
         for e in self.events[-n:]:
-            print(f"[{e.kind}] {e.data}")
+            dur = f" ({e.dur * 1000:.1f}ms)" if e.dur is not None else ""
+            print(f"[{e.kind}]{dur} {e.data}")
@@ -0,0 +1,66 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from react_agent.app.agent_fsm import AgentFSM
+from react_agent.app.checkpoint import FileCheckpointStore
+from react_agent.app.trace import Tracer
+
+# 1、2 互不依赖，3 依赖两者：走 DAG，每个 sub-executor 先调 3 轮 calculator 再回答
+PLAN = [
+    {"id": 1, "goal": "compute a", "tool_hint": "calculator", "depends_on": []},
+    {"id": 2, "goal": "compute b", "tool_hint": "calculator", "depends_on": []},
+    {"id": 3, "goal": "combine", "tool_hint": "calculator", "depends_on": [1, 2]},
+]
+TOOL_ROUNDS = 3
+
+class Crash(BaseException):
+    """模拟进程被杀：不被 agent 的异常处理吞掉。"""
+
+class ScriptedLLM:
+    """只有 respond、没有 stream：plan 一次性返回，不走流水线。crash_after 次调用之后每次都抛 Crash。"""
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def respond(self, input_items, tools=None, tool_choice="auto", timeout=None, text=None, priority=None):
+        with self.lock:
+            if self.crash_after is not None and self.calls >= self.crash_after:
+                raise Crash()
+            self.calls += 1
+        system = " ".join(str(i.get("content")) for i in input_items if i.get("role") == "system").lower()
+        output = [{"type": "message", "content": [{"type": "output_text", "text": "done"}]}]
+        if "router" in system:
+            output[0]["content"][0]["text"] = json.dumps({"route": "react", "tools": ["calculator"], "reason": "x"})
+        elif "planner" in system:
+            output[0]["content"][0]["text"] = json.dumps({"steps": PLAN})
+        elif any("Your step (" in str(i.get("content")) for i in input_items) and tool_choice != "none":
+            rounds = sum(1 for i in input_items if i.get("type") == "function_call_output")
+            if rounds < TOOL_ROUNDS:
+                output = [{
+                    "type": "function_call", "name": "calculator", "call_id": f"c{rounds}",
+                    "arguments": json.dumps({"expression": f"{rounds}+1"}),
+                }]
+        return SimpleNamespace(output=output, usage=SimpleNamespace(input_tokens=1, output_tokens=1, total_tokens=2))
+
+def _calls_for_full_run() -> int:
+    llm = ScriptedLLM()
+    AgentFSM(llm=llm, tracer=Tracer()).run("q")
+    return llm.calls
+
+@pytest.mark.parametrize("crash_after", [4, 7, 10])
+def test_resume_does_not_repeat_substep_rounds(tmp_path, crash_after):
+    total = _calls_for_full_run()
+    store = FileCheckpointStore(str(tmp_path))
+
+    crashing = ScriptedLLM(crash_after=crash_after)
+    with pytest.raises(Crash):
+        AgentFSM(llm=crashing, tracer=Tracer(), checkpoint_store=store).run("q", run_id="r")
+
+    resumed = ScriptedLLM()
+    answer = AgentFSM(llm=resumed, tracer=Tracer(), checkpoint_store=store).resume("r")
+    assert answer == "done"
+    assert crashing.calls + resumed.calls == total
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from react_agent.app.semantic_cache import SemanticCache
+
+# 答案不同的一字 / 一词之差
+NEAR_MISSES = [
+    ("What was the main cause of WWI?", "What was the main cause of WWII?"),
+    ("How many days are in a leap year?", "How many days are in a year?"),
+    ("What is the difference between TCP and UDP?", "What is the difference between TCP and QUIC?"),
+    ("What is 12*34?", "What is 12*35?"),
+]
+
+# 换了语序 / 功能词的问法：默认的词法 key 要命中
+PARAPHRASES = [
+    ("How do I reverse a list in Python?", "How can I reverse a Python list?"),
+    ("What's the capital of France?", "Tell me the capital of France."),
+    ("How many days are there in a leap year?", "In a leap year, how many days are there?"),
+    ("法国的首都是哪里？", "请问法国首都在哪里"),
+]
+
+def _constant_embed(text: str) -> np.ndarray:
+    # 把所有 query 都当成同一个意思的 embedding，只剩 salient_tokens 校验在起作用
+    vec = np.zeros(8, dtype=np.float32)
+    vec[0] = 1.0
+    return vec
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_miss_is_not_a_hit(cached, asked):
+    cache = SemanticCache(capacity=8)
+    cache.put(cached, "cached answer")
+    assert cache.lookup(asked) is None
+
+@pytest.mark.parametrize("cached, asked", PARAPHRASES)
+def test_reworded_question_hits(cached, asked):
+    cache = SemanticCache(capacity=8)
+    cache.put(cached, "answer")
+    assert cache.lookup(asked) == ("answer", 1.0)
+
+def test_synonym_rewrite_needs_embed_fn():
+    cache = SemanticCache(capacity=8)
+    cache.put("Who wrote Hamlet?", "Shakespeare")
+    assert cache.lookup("Who is the author of Hamlet?") is None
+
+    cache = SemanticCache(capacity=8, dim=8, embed_fn=_constant_embed)
+    cache.put("Who wrote Hamlet?", "Shakespeare")
+    assert cache.lookup("Who is the author of Hamlet?")[0] == "Shakespeare"
+
+@pytest.mark.parametrize("cached, asked", [NEAR_MISSES[0], NEAR_MISSES[2], NEAR_MISSES[3]])
+def test_embed_fn_hits_are_checked_for_numbers_and_acronyms(cached, asked):
+    cache = SemanticCache(capacity=8, dim=8, embed_fn=_constant_embed)
+    cache.put(cached, "cached answer")
+    assert cache.lookup(asked) is None
+    assert cache.stats()["guard_rejects"] == 1
+
+def test_entries_survive_restart(tmp_path):
+    cache = SemanticCache(capacity=8, path=str(tmp_path))
+    cache.put("How do I reverse a list in Python?", "lst[::-1]")
+    reopened = SemanticCache(capacity=8, path=str(tmp_path))
+    assert reopened.lookup("How can I reverse a Python list?")[0] == "lst[::-1]"
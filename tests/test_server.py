@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+from react_agent.app.server import AgentServer, ServerConfig, StubLLM
+
+async def _post(port: int, body: dict) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode()
+    writer.write(
+        b"POST /v1/run HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(data)}\r\n\r\n".encode()
+        + data
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    return status
+
+def test_burst_is_bounded_by_admission_queue():
+    async def main():
+        server = AgentServer(
+            ServerConfig(max_concurrency=2, max_queue=1),
+            llm_factory=lambda: StubLLM(latency_s=0.2),
+        )
+        server.slots = asyncio.Semaphore(server.config.max_concurrency)
+        srv = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+        try:
+            statuses = await asyncio.gather(*[_post(port, {"query": "hi", "agent": "react"}) for _ in range(12)])
+        finally:
+            srv.close()
+            await srv.wait_closed()
+            server.pool.shutdown()
+        return statuses, server
+
+    statuses, server = asyncio.run(main())
+    assert statuses.count(200) == 3
+    assert statuses.count(429) == 9
+    assert server.queued == 0 and server.in_flight == 0
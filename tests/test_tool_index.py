@@ -0,0 +1,39 @@
+from react_agent.app.agent_fsm import AgentFSM, AgentConfig
+from react_agent.app.memory import Memory
+from react_agent.app.router import RouteDecision
+from react_agent.app.tool_index import ToolIndex, tokenize
+from react_agent.app.tools import TOOL_INDEX
+from react_agent.app.trace import Tracer
+
+def _tool(name: str, description: str) -> dict:
+    return {"type": "function", "name": name, "description": description, "parameters": {"type": "object", "properties": {}}}
+
+CATALOG = [
+    _tool("calculator", "Safely evaluate a math expression."),
+    _tool("lookup_doc", "What is X? Lookup internal docs about react and fsm."),
+    _tool("weather", "Get the current weather for a city."),
+    _tool("send_email", "Send an email to a recipient."),
+    _tool("search_web", "Search the web for pages."),
+]
+
+def test_stopwords_are_not_indexed():
+    assert tokenize("What is the weather in Paris?") == ["weather", "paris"]
+    assert "是" not in tokenize("什么是状态机")
+
+def test_generic_question_does_not_shut_out_other_tools():
+    # "What is" 以前会命中 lookup_doc，calculator 被挤掉
+    assert TOOL_INDEX.search("What is 12*34?") == []
+    index = ToolIndex(CATALOG)
+    assert index.search("What is 12*34?", k=2) == []
+    assert index.search("What is the weather in Paris?", k=2)[0] == "weather"
+
+def test_kb_topics_retrieve_lookup_doc():
+    assert TOOL_INDEX.search("compare the fsm and react designs") == ["lookup_doc"]
+    assert TOOL_INDEX.search("算一下 12*34")[0] == "calculator"
+
+def test_select_tools_falls_back_to_full_catalog():
+    agent = AgentFSM(llm=None, tracer=Tracer(), config=AgentConfig(tool_top_k=3))
+    agent.user_query = "What is 12*34?"
+    agent.decision = RouteDecision(route="react", tools=[], reason="")
+    tools = agent._select_tools(Memory(), None, agent.user_query, "executor", 0)
+    assert "calculator" in [t["name"] for t in tools]